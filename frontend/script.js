@@ -35,15 +35,41 @@ document.addEventListener('DOMContentLoaded', function() {
     // Tous les repas
     const showAllBtn = document.getElementById('showAllBtn');
     const allFoodsSection = document.getElementById('allFoodsSection');
+    async function chargerPage(cursor) {
+        let url = 'http://localhost:8080/api/foods/all?limit=50';
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(url);
+        if (!response.ok) throw new Error('Erreur lors de la requête');
+        return response.json();
+    }
+    function afficherPage(data) {
+        const oldBtn = document.getElementById('loadMoreBtn');
+        if (oldBtn) oldBtn.remove();
+        allFoodsSection.insertAdjacentHTML('beforeend', data.results.map(item => renderFoodItem(item)).join(''));
+        if (data.next_cursor) {
+            allFoodsSection.insertAdjacentHTML('beforeend', '<button id="loadMoreBtn" type="button">Charger plus</button>');
+            document.getElementById('loadMoreBtn').addEventListener('click', async function() {
+                this.disabled = true;
+                try {
+                    afficherPage(await chargerPage(data.next_cursor));
+                } catch (err) {
+                    this.disabled = false;
+                    allFoodsSection.insertAdjacentHTML('beforeend', `<p style=\"color:red;\">${err.message}</p>`);
+                }
+            });
+        }
+    }
     showAllBtn.addEventListener('click', async function() {
         allFoodsSection.innerHTML = '<p>Chargement de tous les aliments...</p>';
         try {
-            const url = 'http://localhost:8080/api/foods/all';
-            const response = await fetch(url);
-            if (!response.ok) throw new Error('Erreur lors de la requête');
-            const data = await response.json();
-            afficherMessage(allFoodsSection, data.message);
-            afficherResultats(allFoodsSection, data.results);
+            const data = await chargerPage(null);
+            allFoodsSection.innerHTML = '';
+            afficherMessage(allFoodsSection, `${data.total_results} aliments`);
+            if (!data.results || data.results.length === 0) {
+                allFoodsSection.innerHTML += '<p>Aucun résultat trouvé.</p>';
+                return;
+            }
+            afficherPage(data);
         } catch (err) {
             allFoodsSection.innerHTML = `<p style=\"color:red;\">${err.message}</p>`;
         }
@@ -138,13 +164,13 @@ document.addEventListener('DOMContentLoaded', function() {
         let imagesHtml = '';
         if (item.has_images && item.image_urls && item.image_urls.length > 0) {
             imagesHtml = `<div class=\"gallery\">` +
-                item.image_urls.map(img => `<img src=\"${img.url}\" alt=\"${item.name}\" title=\"${img.filename}\">`).join('') +
+                item.image_urls.map(img => `<img src=\"${img.url}?w=160&format=webp\" alt=\"${item.name}\" title=\"${img.filename}\">`).join('') +
                 `</div>`;
         }
         return `
             <div class=\"result-item\">
                 <h3>${item.name}</h3>
-                ${item.thumbnail_url ? `<img src=\"${item.thumbnail_url}\" alt=\"${item.name}\" style=\"width:120px;border-radius:8px;box-shadow:0 1px 4px #0001;\">` : ''}
+                ${item.thumbnail_url ? `<img src=\"${item.thumbnail_url}?w=240&format=webp\" alt=\"${item.name}\" style=\"width:120px;border-radius:8px;box-shadow:0 1px 4px #0001;\">` : ''}
                 <p><strong>Catégorie :</strong> ${item.category || 'N/A'}<br>
                 <strong>Région :</strong> ${item.region || 'N/A'}<br>
                 <strong>Classe :</strong> ${item.ontology_class || 'N/A'}</p>
@@ -1,116 +1,1084 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Blueprint, Response, request, jsonify, send_file, g, has_request_context
 from flask_cors import CORS
-from SPARQLWrapper import SPARQLWrapper, JSON
 import os
+import sys
 import json
 from PIL import Image
 import base64
 import io
-from rdflib import Graph, Namespace, RDF, RDFS, Literal, URIRef
-from elasticsearch import Elasticsearch
+from rdflib import Graph, Namespace, RDF, RDFS, OWL, Literal, URIRef
+from elasticsearch import Elasticsearch, helpers
 import logging
 import time
 from urllib.parse import quote
+from datetime import datetime, timezone
+from werkzeug.http import is_resource_modified
 import difflib
+import populate_kb
 import re
+import threading
+import hashlib
+import hmac
+import tempfile
+import mmap
+import fcntl
+import bisect
+import heapq
+import requests
+from requests.adapters import HTTPAdapter
+from string import Template
+from collections import namedtuple, OrderedDict
+from array import array
+from contextlib import contextmanager
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint('api', __name__)
 
 # Configuration
 FUSEKI_ENDPOINT = "http://localhost:3030/food-kb/sparql"
+SPARQL_TIMEOUT = 5  # seconds allowed per SPARQL query
+SPARQL_POOL_SIZE = 10  # keep-alive connections to Fuseki
+SPARQL_CACHE_SIZE = 1024
+SPARQL_CACHE_TTL = 300  # seconds a cached SPARQL result stays valid
+SPARQL_MAX_LIMIT = 1000  # most foods a knowledge base query returns
 IMAGES_PATH = "/app/data/images"
 ONTOLOGY_NS = "http://www.semanticweb.org/zaz/ontologies/2025/4/untitled-ontology-8#"
 MAPPINGS_FILE = "/app/data/food_mappings.json"
+ONTOLOGY_FILE = "/app/data/ontology/WebSemantics.rdf"  # class hierarchy that class filters expand along
+SEARCH_SNAPSHOT_SUFFIX = ".search-index"  # search index snapshot written next to the mappings file
+SEARCH_SNAPSHOT_FORMAT = 2  # bump when the snapshot layout or the indexed terms change
+MAPPINGS_WATCH_INTERVAL = 10  # seconds between checks of the mappings file for edits, 0 disables
+PUBLISHER_LOCK_FILE = "/tmp/food-service-publisher.lock"  # held by the one process writing reloads to ES and Fuseki
+RELOAD_REQUEST_FILE = "/tmp/food-service-reload.request"  # rewritten by workers asking the publisher to reload
+RELOAD_PUBLISHED_FILE = "/tmp/food-service-reload.published"  # rewritten by the publisher once a reload is written through
+RELOAD_SIGNAL_INTERVAL = 1  # seconds between checks of the reload signal files
+ADMIN_TOKEN = os.environ.get('FOOD_SERVICE_ADMIN_TOKEN')  # required by /api/admin/reload, which is disabled without it
+ES_INDEX_ALIAS = "foods"  # searches go through this alias, which points at a versioned index
+ES_BULK_CHUNK_SIZE = 500
+ES_INDEX_VERSION = 1  # bump when the index settings or documents change shape, to force a rebuild
+ES_CONNECT_INITIAL_DELAY = 1  # seconds, doubled after every failed attempt
+ES_CONNECT_MAX_DELAY = 30
+ES_SEARCH_TIMEOUT = 0.5  # seconds an Elasticsearch search may take before falling back to smart search
+ES_BREAKER_FAILURE_THRESHOLD = 5  # consecutive failed searches that open the circuit breaker
+ES_BREAKER_RESET_TIMEOUT = 15  # seconds an open breaker waits before letting a probe search through
+BATCH_SEARCH_MAX_QUERIES = 100
+BATCH_SEARCH_TIMEOUT = 2  # seconds an Elasticsearch msearch may take before falling back to smart search
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+IMAGE_MANIFEST_POLL_INTERVAL = 30  # seconds between image folder rescans
+IMAGE_CACHE_PATH = "/app/data/image_cache"
+IMAGE_VARIANT_MAX_SIZE = 2048  # bound of the dimension a variant request leaves out
+IMAGE_VARIANT_SIZES = (160, 320, 640, 1280)  # requested widths/heights are snapped up to one of these
+IMAGE_CACHE_MAX_BYTES = 1 << 30  # least recently used variants are evicted past this size
+IMAGE_CACHE_SWEEP_EVERY = 200  # variants generated between two measurements of the cache size
+IMAGE_CACHE_KNOWN_PATHS = 10000  # variant paths remembered per process to skip a stat
+IMAGE_CACHE_TOUCH_INTERVAL = 300  # seconds between mtime updates marking a variant as used
+IMAGE_VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'png': ('PNG', 'image/png', '.png'),
+    'webp': ('WEBP', 'image/webp', '.webp')
+}
+SEARCH_CACHE_SIZE = 2048  # cached /api/search responses
+SEARCH_CACHE_TTL = 600  # seconds
+FOOD_RECORD_CACHE_SIZE = 100000  # per-food response entries kept
+FOOD_RECORD_CACHE_TTL = 3600  # seconds
+ONTOLOGY_EXPORT_CACHE_PATH = "/app/data/export_cache"
+ONTOLOGY_EXPORT_VERSION = 1  # bump when the exported triples change, to retire cached exports
+ONTOLOGY_EXPORT_FORMATS = {  # the first one is the default
+    'rdf': ('xml', 'application/rdf+xml', '.rdf'),
+    'nt': ('nt', 'application/n-triples', '.nt'),
+    'ttl': ('turtle', 'text/turtle', '.ttl'),
+    'jsonld': ('json-ld', 'application/ld+json', '.jsonld')
+}
+ONTOLOGY_EXPORT_CHUNK_SIZE = 1 << 16  # bytes of N-Triples sent at a time
+FACET_FIELDS = ('ontology_class', 'region', 'category', 'preparation', 'nutritional_focus')
+FOODS_PAGE_SIZE = 50  # default page size of /api/foods/all
+FOODS_MAX_PAGE_SIZE = 500
+SUGGEST_MAX_LIMIT = 50  # most suggestions /api/search/suggest returns
+NDJSON_MIMETYPE = 'application/x-ndjson'
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+HEALTH_CHECK_TIMEOUT = 1  # seconds each dependency check of /health may take
 
-# Initialize SPARQL wrapper
-sparql = SPARQLWrapper(FUSEKI_ENDPOINT)
-sparql.setReturnFormat(JSON)
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live"""
+    
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """Cached value for a key, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value):
+        """Cache a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Size and hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class Histogram:
+    """Latency histogram with Prometheus-style cumulative buckets"""
+    
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms, exposed in the Prometheus
+    text format by /metrics.
+    
+    Every server process keeps its own, so series carry the process id as a
+    'worker' label and stay monotonic whichever worker a scrape reaches.
+    """
+    
+    DESCRIPTIONS = {
+        'food_service_request_duration_seconds': ('histogram', "Request latency by endpoint"),
+        'food_service_stage_duration_seconds': ('histogram', "Time spent in each stage of a request"),
+        'food_service_cache_hits_total': ('counter', "Cache lookups that found an entry"),
+        'food_service_cache_misses_total': ('counter', "Cache lookups that found no entry"),
+        'food_service_cache_hit_ratio': ('gauge', "Share of cache lookups that found an entry"),
+        'food_service_cache_entries': ('gauge', "Entries held by a cache"),
+        'food_service_elasticsearch_fallbacks_total': ('counter', "Searches answered by smart search instead of Elasticsearch"),
+        'food_service_elasticsearch_ready': ('gauge', "Whether searches go to Elasticsearch"),
+        'food_service_elasticsearch_breaker_open': ('gauge', "Whether the Elasticsearch circuit breaker is not closed"),
+        'food_service_index_build_seconds': ('gauge', "Duration of the last build of an index"),
+        'food_service_index_builds_total': ('counter', "Builds of an index"),
+        'food_service_foods': ('gauge', "Foods in the loaded catalogue"),
+        'food_service_generation': ('gauge', "Reloads that changed the catalogue")
+    }
+    
+    def __init__(self):
+        self.values = {}  # (name, sorted label items) -> number or Histogram
+        self._lock = threading.Lock()
+    
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = Histogram()
+            histogram.observe(value)
+    
+    @staticmethod
+    def _labels(labels):
+        """Prometheus label set, with the values escaped"""
+        return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                              for name, value in labels) + '}'
+    
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        worker = (('worker', str(os.getpid())),)
+        with self._lock:
+            values = sorted((key, value.counts[:], value.sum) if isinstance(value, Histogram) else (key, value, None)
+                            for key, value in self.values.items())
+        
+        lines = []
+        described = set()
+        for (name, labels), value, histogram_sum in values:
+            metric_type, description = self.DESCRIPTIONS.get(name, ('untyped', name))
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {metric_type}")
+            labels = worker + labels
+            if histogram_sum is None:
+                lines.append(f"{name}{self._labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(METRICS_LATENCY_BUCKETS + ('+Inf',), value):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram_sum}")
+            lines.append(f"{name}_count{self._labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+_timed_stages = threading.local()
+
+@contextmanager
+def timed(stage):
+    """Time a stage of the current request, for its Server-Timing header and /metrics.
+    
+    The time of a stage timed within another one is left out of the outer
+    stage, so the stages of a request add up to at most its total.
+    """
+    nested = _timed_stages.__dict__.setdefault('nested', [])
+    nested.append(0.0)  # time spent in the stages timed within this one
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        elapsed = duration - nested.pop()
+        if nested:
+            nested[-1] += duration
+        metrics.observe('food_service_stage_duration_seconds', elapsed, stage=stage)
+        if has_request_context():
+            timings = g.setdefault('timings', {})
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def record_index_build(index, seconds):
+    """Record how long building an index took"""
+    metrics.set('food_service_index_build_seconds', round(seconds, 6), index=index)
+    metrics.increment('food_service_index_builds_total', index=index)
 
-# Initialize Elasticsearch for text search - Fixed configuration
-def init_elasticsearch():
-    """Initialize Elasticsearch with proper configuration and retry logic"""
-    max_retries = 5
-    retry_delay = 10
+class SparqlClient:
+    """Access to the Fuseki knowledge base over pooled keep-alive connections,
+    with prepared query templates, per-query timeouts and cached results"""
+    
+    PREFIXES = f"""PREFIX : <{ONTOLOGY_NS}>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+    
+    # Prepared templates; parameters are always substituted as escaped RDF terms
+    FOODS_QUERY = Template(PREFIXES + """SELECT DISTINCT ?food ?label WHERE {
+    ?food rdfs:label ?label .
+$patterns}
+ORDER BY ?label
+LIMIT $limit""")
+    FOOD_PATTERNS = {
+        'class': Template("    ?food a ?class .\n    VALUES ?class { $value }\n"),
+        'region': Template("    ?food :belongsToRegion $value .\n"),
+        'ingredient': Template("    ?food :hasIngredient ?ingredient .\n"
+                               "    FILTER(LCASE(STR(?ingredient)) = LCASE($value))\n")
+    }
+    ASK_QUERY = "ASK { }"
+    
+    def __init__(self, endpoint, timeout=SPARQL_TIMEOUT, pool_size=SPARQL_POOL_SIZE,
+                 cache_size=SPARQL_CACHE_SIZE, cache_ttl=SPARQL_CACHE_TTL):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def _execute(self, query, timeout=None):
+        """Run a query and return its parsed JSON results"""
+        response = self.session.post(
+            self.endpoint,
+            data={'query': query},
+            headers={'Accept': 'application/sparql-results+json'},
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def _term(self, name, value):
+        """Render a query parameter as a safely escaped RDF term; a class
+        filter can be a list of classes, rendered as a list of terms"""
+        if name == 'class':
+            class_names = [value] if isinstance(value, str) else value
+            for class_name in class_names:
+                if not re.fullmatch(r'[A-Za-z_][\w\-]*', class_name):
+                    raise ValueError(f"Invalid ontology class: {class_name}")
+            return ' '.join(URIRef(ONTOLOGY_NS + class_name).n3() for class_name in class_names)
+        return Literal(value).n3()
     
-    for attempt in range(max_retries):
+    def find_foods(self, limit=100, **filters):
+        """Foods matching all of the given class, region and ingredient filters.
+        
+        The class filter can be a tuple of classes, any of which matches, and
+        limit is capped at SPARQL_MAX_LIMIT.
+        """
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, SPARQL_MAX_LIMIT)
+        filters = {name: value for name, value in filters.items() if value}
+        unknown = set(filters) - set(self.FOOD_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        
+        key = ('foods', tuple(sorted(filters.items())), limit)
+        rows = self.cache.get(key)
+        if rows is not None:
+            return rows
+        
+        patterns = ''.join(self.FOOD_PATTERNS[name].substitute(value=self._term(name, value))
+                           for name, value in sorted(filters.items()))
+        results = self._execute(self.FOODS_QUERY.substitute(patterns=patterns, limit=limit))
+        rows = [
+            {'uri': binding['food']['value'], 'name': binding['label']['value']}
+            for binding in results['results']['bindings']
+        ]
+        self.cache.set(key, rows)
+        return rows
+    
+    def ping(self, timeout=2):
+        """Whether the endpoint answers a trivial query"""
         try:
-            # Fixed Elasticsearch client initialization
-            es = Elasticsearch(
-                hosts=[{'host': 'elasticsearch', 'port': 9200, 'scheme': 'http'}],
-                request_timeout=30,
-                max_retries=3,
-                retry_on_timeout=True
-            )
-            
-            # Test connection
-            if es.ping():
-                print("✅ Elasticsearch connection successful!")
-                return es
-            else:
-                print(f"❌ Elasticsearch ping failed on attempt {attempt + 1}")
-                
-        except Exception as e:
-            print(f"❌ Elasticsearch connection attempt {attempt + 1} failed: {e}")
-            
-        if attempt < max_retries - 1:
-            print(f"⏳ Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+            return self._execute(self.ASK_QUERY, timeout=timeout).get('boolean') is True
+        except Exception:
+            return False
     
-    print("⚠️ Could not connect to Elasticsearch. Search functionality will be limited.")
+    def invalidate(self):
+        """Forget cached results, e.g. after the knowledge base was reloaded"""
+        self.cache.clear()
+
+# Initialize SPARQL client
+sparql = SparqlClient(FUSEKI_ENDPOINT)
+
+def create_elasticsearch_client(max_retries=3):
+    """Elasticsearch client for the compose service"""
+    return Elasticsearch(
+        hosts=[{'host': 'elasticsearch', 'port': 9200, 'scheme': 'http'}],
+        request_timeout=30,
+        max_retries=max_retries,
+        retry_on_timeout=max_retries > 0
+    )
+
+def connect_elasticsearch():
+    """A connected Elasticsearch client, or None if the cluster does not answer"""
+    try:
+        client = create_elasticsearch_client()
+        if client.ping():
+            print("✅ Elasticsearch connection successful!")
+            return client
+        print("❌ Elasticsearch ping failed")
+    except Exception as e:
+        print(f"❌ Elasticsearch connection failed: {e}")
     return None
 
-# Initialize Elasticsearch with retry logic
-es = init_elasticsearch()
+# Set up by create_app() and the background Elasticsearch setup
+es = None
+es_search = None  # searches get a client without retries so they stay within ES_SEARCH_TIMEOUT
+service = None
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while, then lets a single probe
+    call through (half-open) to find out whether it recovered"""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Whether a call may go through now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN  # this caller is the probe
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+def start_poller(name, interval, callback):
+    """Call a function every interval seconds from a daemon thread"""
+    def poll():
+        while True:
+            time.sleep(interval)
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error in {name}: {e}")
+    
+    thread = threading.Thread(target=poll, name=name, daemon=True)
+    thread.start()
+    return thread
+
+class ReadWriteLock:
+    """Lock held by any number of readers at once, or by a single writer,
+    which may take it again. Waiting writers go before new readers."""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._writes = 0  # nesting depth of the writer
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def writing(self):
+        thread = threading.get_ident()
+        with self._condition:
+            if self._writer != thread:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                self._waiting_writers -= 1
+                self._writer = thread
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = None
+                    self._condition.notify_all()
+
+class SuggestionEngine:
+    """Type-ahead completions and spelling corrections over the search terms.
+    
+    Completions are read from the sorted term list, which serves as a
+    flattened prefix trie; prefixes matching more than SCAN_LIMIT terms keep
+    their best completions precomputed. Corrections are SymSpell-style: every
+    word of the terms is indexed under the variants of its prefix with up to
+    MAX_EDIT_DISTANCE characters deleted, so a misspelled word only needs its
+    own variants looked up, and only the words found that way are given an
+    exact edit distance. The corrected query is then completed.
+    """
+    
+    MAX_EDIT_DISTANCE = 2
+    PREFIX_LENGTH = 7  # characters of a word indexed for corrections
+    SCAN_LIMIT = 256  # prefixes matching more terms than this have precomputed completions
+    TOP_K = 20
+    WORD_CANDIDATES = 3  # corrections tried for each misspelled word
+    
+    def __init__(self, entries=()):
+        """entries are (key, display, weight, kind) tuples"""
+        self.entries = {key: (display, weight, kind) for key, display, weight, kind in entries}
+        self.keys = sorted(self.entries)
+        self.word_counts = {}
+        self.deletes = {}
+        for key in self.keys:
+            self._add_words(key)
+        
+        self.top = {}
+        self._precompute('', 0, len(self.keys))
+    
+    @classmethod
+    def restore(cls, entries, keys, word_counts, deletes, top):
+        """Engine put back together from the structures of a saved one"""
+        engine = cls.__new__(cls)
+        engine.entries = entries
+        engine.keys = keys
+        engine.word_counts = word_counts
+        engine.deletes = deletes
+        engine.top = top
+        return engine
+    
+    def _precompute(self, prefix, start, end):
+        """Store the best completions of every prefix longer than prefix whose
+        range, within keys[start:end], is larger than SCAN_LIMIT"""
+        depth = len(prefix)
+        position = start
+        while position < end:
+            key = self.keys[position]
+            if len(key) <= depth:
+                position += 1
+                continue
+            child = key[:depth + 1]
+            child_end = bisect.bisect_left(self.keys, self._successor(child), position, end)
+            if child_end - position > self.SCAN_LIMIT:
+                self.top[child] = heapq.nsmallest(self.TOP_K, self.keys[position:child_end], key=self._rank)
+                self._precompute(child, position, child_end)
+            position = child_end
+    
+    @staticmethod
+    def _successor(prefix):
+        """Smallest string sorting after every string starting with prefix"""
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    
+    def _rank(self, key):
+        """Sort key of completions: heavier, then shorter terms first"""
+        return (-self.entries[key][1], len(key), key)
+    
+    def _scan(self, prefix, k):
+        """Best k keys starting with prefix, found by scanning their range"""
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, self._successor(prefix), start)
+        return heapq.nsmallest(k, self.keys[start:end], key=self._rank)
+    
+    def _deletes(self, word, max_distance):
+        """Variants of word with up to max_distance characters deleted, word included"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(max_distance):
+            frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+            variants |= frontier
+        return variants
+    
+    @staticmethod
+    def _is_spelled(word):
+        """Whether a word can be misspelled; numbers and symbols are not corrected"""
+        return any(char.isalpha() for char in word)
+    
+    def _add_words(self, key):
+        for word in key.split():
+            count = self.word_counts.get(word, 0)
+            self.word_counts[word] = count + 1
+            if not count and self._is_spelled(word):
+                for variant in self._deletes(word[:self.PREFIX_LENGTH], self.MAX_EDIT_DISTANCE):
+                    self.deletes.setdefault(variant, []).append(word)
+    
+    def _remove_words(self, key):
+        # Words leave the deletes before their counts, which corrections look up
+        for word in key.split():
+            count = self.word_counts[word]
+            if count > 1:
+                self.word_counts[word] = count - 1
+                continue
+            if self._is_spelled(word):
+                for variant in self._deletes(word[:self.PREFIX_LENGTH], self.MAX_EDIT_DISTANCE):
+                    remaining = [other for other in self.deletes[variant] if other != word]
+                    if remaining:
+                        self.deletes[variant] = remaining
+                    else:
+                        del self.deletes[variant]
+            del self.word_counts[word]
+    
+    def _precomputed_prefixes(self, key):
+        return [key[:depth] for depth in range(1, len(key) + 1) if key[:depth] in self.top]
+    
+    def add(self, key, display, weight, kind):
+        """Add a term, or replace the display, weight and kind of an existing one.
+        
+        The entry goes in before the key is listed anywhere, and remove()
+        unlists a key before dropping its entry, so readers always find the
+        entry of a key they come across.
+        """
+        is_new = key not in self.entries
+        self.entries[key] = (display, weight, kind)
+        if is_new:
+            self.keys.insert(bisect.bisect_left(self.keys, key), key)
+            self._add_words(key)
+        
+        for prefix in self._precomputed_prefixes(key):
+            top = [other for other in self.top[prefix] if other != key]
+            if len(top) < self.TOP_K and not is_new:
+                # The key may have dropped below terms that are not in the list
+                self.top[prefix] = self._scan(prefix, self.TOP_K)
+            else:
+                top.append(key)
+                self.top[prefix] = sorted(top, key=self._rank)[:self.TOP_K]
+    
+    def remove(self, key):
+        """Remove a term"""
+        if self.entries.get(key) is None:
+            return
+        prefixes = [prefix for prefix in self._precomputed_prefixes(key) if key in self.top[prefix]]
+        del self.keys[bisect.bisect_left(self.keys, key)]
+        for prefix in prefixes:
+            self.top[prefix] = self._scan(prefix, self.TOP_K)
+        self._remove_words(key)
+        del self.entries[key]
+    
+    def complete(self, prefix, k):
+        """Up to k keys starting with prefix, best first"""
+        if not prefix:
+            return []
+        if prefix in self.top and k <= self.TOP_K:
+            return self.top[prefix][:k]
+        return self._scan(prefix, k)
+    
+    def _word_corrections(self, word):
+        """Known words close to word as (distance, word) pairs, closest and most common first"""
+        max_distance = 1 if len(word) <= 4 else self.MAX_EDIT_DISTANCE
+        candidates = set()
+        for variant in self._deletes(word[:self.PREFIX_LENGTH], max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+        
+        scored = []
+        for candidate in candidates:
+            if candidate == word or abs(len(candidate) - len(word)) > max_distance:
+                continue
+            distance = self._edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -self.word_counts[candidate], candidate))
+        return [(distance, candidate) for distance, _, candidate in
+                heapq.nsmallest(self.WORD_CANDIDATES, scored)]
+    
+    def correct(self, query, k):
+        """Up to k keys completing query once its misspelled words are corrected"""
+        words = query.split()
+        phrases = [(0, [])]
+        for position, word in enumerate(words):
+            # The last word may still be being typed, so it is kept as a prefix
+            if word in self.word_counts or position == len(words) - 1:
+                options = [(0, word)]
+            else:
+                options = []
+            if word not in self.word_counts and self._is_spelled(word):
+                options += self._word_corrections(word)
+            if not options:
+                return []
+            phrases = sorted(((distance + option_distance, phrase + [option])
+                              for distance, phrase in phrases
+                              for option_distance, option in options),
+                             key=lambda item: item[0])[:self.WORD_CANDIDATES]
+        
+        keys = []
+        for distance, phrase in phrases:
+            if distance:
+                keys += [(distance,) + self._rank(key) for key in self.complete(' '.join(phrase), k)]
+        return [ranked[-1] for ranked in heapq.nsmallest(k, set(keys))]
+    
+    @staticmethod
+    def _edit_distance(a, b, max_distance):
+        """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+        previous2 = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = a[i - 1] != b[j - 1]
+                current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    current[j] = min(current[j], previous2[j - 2] + 1)
+            if min(current) > max_distance:
+                return max_distance + 1
+            previous2, previous = previous, current
+        return previous[-1]
+    
+    def suggest(self, query, k):
+        """Completions of query, then completions of its corrections, as suggestion dicts"""
+        query = query.lower().strip()
+        if not query:
+            return []
+        
+        suggestions = []
+        seen = set()
+        for key, match in [(key, 'completion') for key in self.complete(query, k)] + \
+                          [(key, 'correction') for key in self.correct(query, k)]:
+            display, _, kind = self.entries[key]
+            if display in seen:
+                continue
+            seen.add(display)
+            if match == 'correction':
+                match = 'spelling_correction' if kind == 'name' else 'search_term'
+            suggestions.append({
+                'suggestion': display,
+                'similarity': difflib.SequenceMatcher(None, query, key).ratio(),
+                'type': match
+            })
+            if len(suggestions) == k:
+                break
+        return suggestions
 
 class SmartSearchEngine:
-    """Enhanced search engine with case-insensitive and auto-correct capabilities"""
+    """Enhanced search engine with case-insensitive and auto-correct capabilities.
+    
+    The postings of a term are packed into an array of ints, each holding a
+    food id and a match type code (food_id << TYPE_BITS | code); scores
+    follow from the match type. Result dicts are only built for the foods
+    a search returns.
+    """
+    
+    # Match type codes, with their names and scores
+    NAME, ALTERNATIVE, INGREDIENT, CULTURE, CATEGORY = range(5)
+    MATCH_TYPES = ('name', 'alternative', 'ingredient', 'culture', 'category')
+    MATCH_SCORES = (1.0, 0.8, 0.6, 0.5, 0.4)
+    TYPE_BITS = 3
+    TYPE_MASK = (1 << TYPE_BITS) - 1
+    
+    # Trigrams narrow down containment lookups, and bigrams those of
+    # two-character queries. Typo candidates are found by counting the
+    # characters each term has in common with the query instead, since
+    # difflib can match scattered single characters.
+    GRAM_SIZE = 3
+    SHORT_GRAM_SIZE = 2
     
     def __init__(self, food_mappings):
         self.food_mappings = food_mappings
-        self.food_names = list(food_mappings.keys())
-        self.food_names_lower = [name.lower() for name in self.food_names]
+        # Searches read the index while add_food() and remove_food() write it
+        self._lock = ReadWriteLock()
         self.search_index = self._build_search_index()
+        self.suggester = SuggestionEngine(
+            (term,) + self._suggestion_entry(term) for term in self.search_index
+        )
     
     def _build_search_index(self):
         """Build comprehensive search index"""
+        # Food ids index food_names; a removed food keeps its id for when it comes back
+        self.food_names = []
+        self.food_ids = {}
         index = {}
         
         for food_name, properties in self.food_mappings.items():
-            # Add the food name itself
-            self._add_to_index(index, food_name.lower(), food_name, 'name', 1.0)
-            
-            # Add alternative terms
-            alternatives = self._generate_alternatives(food_name)
-            for alt in alternatives:
-                self._add_to_index(index, alt.lower(), food_name, 'alternative', 0.8)
-            
-            # Add ingredients
-            ingredients = properties.get('primary_ingredients', [])
-            for ingredient in ingredients:
-                self._add_to_index(index, ingredient.lower(), food_name, 'ingredient', 0.6)
-            
-            # Add cultural origin
-            cultural_origin = properties.get('cultural_origin', '')
-            if cultural_origin and cultural_origin != 'Unknown':
-                self._add_to_index(index, cultural_origin.lower(), food_name, 'culture', 0.5)
-            
-            # Add category
-            category = properties.get('category', '')
-            if category and category != 'Unknown':
-                self._add_to_index(index, category.lower(), food_name, 'category', 0.4)
+            food_id = self._food_id(food_name)
+            for term, match_type in self._food_terms(food_name, properties):
+                postings = index.get(term)
+                if postings is None:
+                    postings = index[term] = array('I')
+                postings.append(food_id << self.TYPE_BITS | match_type)
+        
+        # Character n-gram index over the terms so partial and fuzzy lookups
+        # only touch terms that share grams with the query. Term ids follow
+        # the index order; removed terms leave a None slot behind.
+        self.terms = []
+        self.term_ids = {}
+        self.max_term_length = 0
+        self.gram_index = {}
+        for term in index:
+            self._register_term(term)
+        self._build_char_index()
         
         return index
     
-    def _add_to_index(self, index, term, food_name, match_type, score):
-        """Add term to search index"""
-        if term not in index:
-            index[term] = []
-        index[term].append({
-            'food_name': food_name,
-            'match_type': match_type,
-            'score': score
-        })
+    def _food_terms(self, food_name, properties):
+        """Search terms of a food as (term, match type code) tuples"""
+        # Add the food name itself
+        yield food_name.lower(), self.NAME
+        
+        # Add alternative terms
+        alternatives = self._generate_alternatives(food_name)
+        for alt in alternatives:
+            yield alt.lower(), self.ALTERNATIVE
+        
+        # Add ingredients
+        ingredients = properties.get('primary_ingredients', [])
+        for ingredient in ingredients:
+            yield ingredient.lower(), self.INGREDIENT
+        
+        # Add cultural origin
+        cultural_origin = properties.get('cultural_origin', '')
+        if cultural_origin and cultural_origin != 'Unknown':
+            yield cultural_origin.lower(), self.CULTURE
+        
+        # Add category
+        category = properties.get('category', '')
+        if category and category != 'Unknown':
+            yield category.lower(), self.CATEGORY
+    
+    def _food_id(self, food_name):
+        """Id of a food, assigned on first sight"""
+        food_id = self.food_ids.get(food_name)
+        if food_id is None:
+            food_id = self.food_ids[food_name] = len(self.food_names)
+            self.food_names.append(food_name)
+        return food_id
+    
+    def _register_term(self, term):
+        """Give a new term an id and add it to the n-gram index"""
+        term_id = len(self.terms)
+        self.terms.append(term)
+        self.term_ids[term] = term_id
+        self.max_term_length = max(self.max_term_length, len(term))
+        for gram in self._grams(term, self.GRAM_SIZE) | self._grams(term, self.SHORT_GRAM_SIZE):
+            postings = self.gram_index.get(gram)
+            # Postings loaded from a snapshot are read-only views, copied on first change
+            if not isinstance(postings, array):
+                postings = self.gram_index[gram] = array('I', postings or ())
+            postings.append(term_id)
+        return term_id
+    
+    def _build_char_index(self):
+        """Bitsets over the term ids of the terms holding each character
+        token, and of the terms of each length"""
+        token_ids = {}
+        length_ids = {}
+        for term_id, term in enumerate(self.terms):
+            if term is None:
+                continue
+            for token in self._char_tokens(term):
+                token_ids.setdefault(token, []).append(term_id)
+            length_ids.setdefault(len(term), []).append(term_id)
+        
+        size = len(self.terms)
+        self.char_bits = {token: to_bitset(term_ids, size) for token, term_ids in token_ids.items()}
+        self.length_bits = {length: to_bitset(term_ids, size) for length, term_ids in length_ids.items()}
+    
+    def _set_term_chars(self, term_id, term, present):
+        """Set or clear a term in the character token and length bitsets"""
+        bit = 1 << term_id
+        for token in self._char_tokens(term):
+            bits = self.char_bits.get(token, 0)
+            self.char_bits[token] = bits | bit if present else bits & ~bit
+        bits = self.length_bits.get(len(term), 0)
+        self.length_bits[len(term)] = bits | bit if present else bits & ~bit
+    
+    def _char_tokens(self, text):
+        """Characters of a string with their repeats numbered, so that 'banana'
+        gives b, a, n, aa, nn and aaa: two strings have as many tokens in
+        common as they have characters in common"""
+        seen = {}
+        tokens = []
+        for char in text:
+            seen[char] = seen.get(char, 0) + 1
+            tokens.append(char * seen[char])
+        return tokens
+    
+    def write_snapshot(self, path, content_hash):
+        """Save the index to path, for load_snapshot() to map it back in.
+        
+        The file holds a JSON header, the food names, terms and grams as JSON
+        lists, the term and gram postings as native uint32 arrays, and the
+        character token and term length bitsets as little-endian ints. It is
+        written to a temporary file first and renamed into place, so readers
+        never see a partial snapshot. Only a freshly built index, without
+        removed terms, can be saved.
+        """
+        terms = self.terms
+        grams = list(self.gram_index)
+        posting_offsets = array('I', [0])
+        for term in terms:
+            posting_offsets.append(posting_offsets[-1] + len(self.search_index[term]))
+        gram_offsets = array('I', [0])
+        for gram in grams:
+            gram_offsets.append(gram_offsets[-1] + len(self.gram_index[gram]))
+        tokens = list(self.char_bits)
+        lengths = list(self.length_bits)
+        bitset_size = (len(terms) + 7) // 8
+        
+        suggestions = []
+        for term in terms:
+            display, weight, kind = self.suggester.entries[term]
+            suggestions.append([display if kind == 'name' else None, weight])
+        # Keys and precomputed completions are stored as term ids
+        suggester = {
+            "keys": [self.term_ids[key] for key in self.suggester.keys],
+            "top": {prefix: [self.term_ids[key] for key in keys] for prefix, keys in self.suggester.top.items()},
+            "word_counts": self.suggester.word_counts,
+            "deletes": self.suggester.deletes
+        }
+        
+        sections = [
+            ('food_names', json.dumps(self.food_names).encode('utf-8')),
+            ('terms', json.dumps(terms).encode('utf-8')),
+            ('grams', json.dumps(grams).encode('utf-8')),
+            ('suggestions', json.dumps(suggestions).encode('utf-8')),
+            ('suggester', json.dumps(suggester).encode('utf-8')),
+            ('posting_offsets', posting_offsets.tobytes()),
+            ('postings', b''.join(self.search_index[term].tobytes() for term in terms)),
+            ('gram_offsets', gram_offsets.tobytes()),
+            ('gram_postings', b''.join(array('I', self.gram_index[gram]).tobytes() for gram in grams)),
+            ('char_tokens', json.dumps(tokens).encode('utf-8')),
+            ('char_bits', b''.join(self.char_bits[token].to_bytes(bitset_size, 'little') for token in tokens)),
+            ('lengths', json.dumps(lengths).encode('utf-8')),
+            ('length_bits', b''.join(self.length_bits[length].to_bytes(bitset_size, 'little') for length in lengths))
+        ]
+        
+        # Section offsets are relative to the end of the header; everything is 8-byte aligned
+        header = {
+            "format": SEARCH_SNAPSHOT_FORMAT,
+            "content_hash": content_hash,
+            "byteorder": sys.byteorder,
+            "sections": {}
+        }
+        offset = 0
+        for name, data in sections:
+            header["sections"][name] = [offset, len(data)]
+            offset += len(data) + (-len(data) % 8)
+        header_bytes = json.dumps(header).encode('utf-8')
+        header_bytes += b' ' * (-len(header_bytes) % 8)
+        
+        directory = os.path.dirname(path) or '.'
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.search-index-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(len(header_bytes).to_bytes(8, 'little'))
+                f.write(header_bytes)
+                for _, data in sections:
+                    f.write(data)
+                    f.write(b'\0' * (-len(data) % 8))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    @classmethod
+    def load_snapshot(cls, path, food_mappings, content_hash):
+        """Engine mapped in from a snapshot written by write_snapshot(), or None
+        if there is no snapshot for this content hash.
+        
+        The gram postings stay views over the mapped file, so they are shared
+        by every process that loads the same snapshot; neither the search
+        terms nor the suggestion structures are recomputed.
+        """
+        try:
+            with open(path, 'rb') as f:
+                snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        
+        try:
+            header_length = int.from_bytes(snapshot[:8], 'little')
+            header = json.loads(snapshot[8:8 + header_length])
+        except ValueError:
+            header = {}
+        if (header.get("format") != SEARCH_SNAPSHOT_FORMAT or header.get("content_hash") != content_hash
+                or header.get("byteorder") != sys.byteorder):
+            snapshot.close()
+            return None
+        
+        view = memoryview(snapshot)[8 + header_length:]
+        
+        def section(name):
+            offset, length = header["sections"][name]
+            return view[offset:offset + length]
+        
+        def strings(name):
+            return json.loads(bytes(section(name)))
+        
+        engine = cls.__new__(cls)
+        engine.food_mappings = food_mappings
+        engine._lock = ReadWriteLock()
+        engine.food_names = strings('food_names')
+        engine.food_ids = {food_name: food_id for food_id, food_name in enumerate(engine.food_names)}
+        
+        engine.terms = strings('terms')
+        engine.term_ids = {term: term_id for term_id, term in enumerate(engine.terms)}
+        engine.max_term_length = max(map(len, engine.terms), default=0)
+        
+        # Term postings are small and get replaced on reloads, so they are copied out
+        engine.search_index = {}
+        posting_offsets = section('posting_offsets').cast('I')
+        postings = section('postings')
+        for term_id, term in enumerate(engine.terms):
+            term_postings = array('I')
+            term_postings.frombytes(postings[posting_offsets[term_id] * 4:posting_offsets[term_id + 1] * 4])
+            engine.search_index[term] = term_postings
+        
+        gram_offsets = section('gram_offsets').cast('I')
+        gram_postings = section('gram_postings').cast('I')
+        engine.gram_index = {gram: gram_postings[gram_offsets[gram_id]:gram_offsets[gram_id + 1]]
+                             for gram_id, gram in enumerate(strings('grams'))}
+        
+        bitset_size = (len(engine.terms) + 7) // 8
+        
+        def bitsets(keys, name):
+            data = section(name)
+            return {key: int.from_bytes(data[i * bitset_size:(i + 1) * bitset_size], 'little')
+                    for i, key in enumerate(strings(keys))}
+        
+        engine.char_bits = bitsets('char_tokens', 'char_bits')
+        engine.length_bits = bitsets('lengths', 'length_bits')
+        
+        terms = engine.terms
+        suggester = strings('suggester')
+        engine.suggester = SuggestionEngine.restore(
+            {term: (display if display is not None else term, weight, 'name' if display is not None else 'term')
+             for term, (display, weight) in zip(terms, strings('suggestions'))},
+            [terms[term_id] for term_id in suggester["keys"]],
+            suggester["word_counts"],
+            suggester["deletes"],
+            {prefix: [terms[term_id] for term_id in keys] for prefix, keys in suggester["top"].items()}
+        )
+        return engine
+    
+    def _suggestion_entry(self, term):
+        """(display, weight, kind) of a term for the suggestion engine"""
+        postings = self.search_index[term]
+        name_posting = next((posting for posting in postings if posting & self.TYPE_MASK == self.NAME), None)
+        return (
+            self.food_names[name_posting >> self.TYPE_BITS] if name_posting is not None else term,
+            max(self.MATCH_SCORES[posting & self.TYPE_MASK] for posting in postings),
+            'name' if name_posting is not None else 'term'
+        )
+    
+    def updating(self):
+        """Context in which searches wait for a batch of add_food() and
+        remove_food() calls, so they never see it half applied"""
+        return self._lock.writing()
+    
+    def add_food(self, food_name, properties):
+        """Add a single food to the search index"""
+        with self._lock.writing():
+            food_id = self._food_id(food_name)
+            for term, match_type in self._food_terms(food_name, properties):
+                if term not in self.term_ids:
+                    self._set_term_chars(self._register_term(term), term, True)
+                postings = array('I', self.search_index.get(term, ()))
+                postings.append(food_id << self.TYPE_BITS | match_type)
+                self.search_index[term] = postings
+                self.suggester.add(term, *self._suggestion_entry(term))
+    
+    def remove_food(self, food_name, properties):
+        """Remove a single food, indexed with the given properties, from the search index"""
+        with self._lock.writing():
+            food_id = self.food_ids.get(food_name)
+            for term in {term for term, _ in self._food_terms(food_name, properties)}:
+                postings = self.search_index.get(term)
+                if postings is None:
+                    continue
+                
+                remaining = array('I', (posting for posting in postings if posting >> self.TYPE_BITS != food_id))
+                if remaining:
+                    self.search_index[term] = remaining
+                    self.suggester.add(term, *self._suggestion_entry(term))
+                else:
+                    del self.search_index[term]
+                    term_id = self.term_ids.pop(term)
+                    self.terms[term_id] = None
+                    self._set_term_chars(term_id, term, False)
+                    self.suggester.remove(term)
     
     def _generate_alternatives(self, food_name):
         """Generate alternative search terms for a food name"""
@@ -144,147 +1112,770 @@ class SmartSearchEngine:
         
         return alternatives
     
+    def _grams(self, text, size):
+        """Character n-grams of a string"""
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+    
+    def _partial_candidates(self, query):
+        """Ids of the terms that contain the query or are contained in it"""
+        candidates = set()
+        
+        # Terms contained in the query are substrings of it
+        query_length = len(query)
+        for start in range(query_length + 1):
+            longest = min(query_length, start + self.max_term_length)
+            for end in range(start, longest + 1):
+                term_id = self.term_ids.get(query[start:end])
+                if term_id is not None:
+                    candidates.add(term_id)
+        
+        # Terms containing the query hold every trigram of the query
+        if query_length >= self.GRAM_SIZE:
+            postings = [self.gram_index.get(gram, ()) for gram in self._grams(query, self.GRAM_SIZE)]
+            postings.sort(key=len)
+            if postings[0]:
+                shared = set(postings[0]).intersection(*postings[1:])
+                candidates.update(term_id for term_id in shared
+                                  if self.terms[term_id] is not None and query in self.terms[term_id])
+        elif query_length == self.SHORT_GRAM_SIZE:
+            candidates.update(self.gram_index.get(query, ()))
+        else:
+            # A single character matches most terms anyway
+            candidates.update(term_id for term_id, term in enumerate(self.terms)
+                              if term is not None and query in term)
+        
+        return candidates
+    
+    def _fuzzy_candidates(self, query):
+        """(term id, characters in common) of the terms having enough
+        characters in common with the query to be similar to it.
+        
+        A difflib ratio is 2 * matched characters / total length, and no more
+        characters match than the two strings have in common, so a term of
+        length L needs at least 0.3 * (len(query) + L) of them. The counts
+        of all terms are summed up at once from the bitsets of the query's
+        character tokens, in binary with one bitset per bit of the count.
+        """
+        query_length = len(query)
+        counts = []
+        for token in self._char_tokens(query):
+            carry = self.char_bits.get(token, 0)
+            for bit, plane in enumerate(counts):
+                if not carry:
+                    break
+                counts[bit], carry = plane ^ carry, plane & carry
+            if carry:
+                counts.append(carry)
+        
+        candidates = []
+        lengths = 0  # bitset of the terms short enough for the current count
+        length = 0
+        for shared in range(1, query_length + 1):
+            longest = min((10 * shared - 3 * query_length) // 3, self.max_term_length)
+            while length < longest:
+                length += 1
+                lengths |= self.length_bits.get(length, 0)
+            if not lengths or shared >> len(counts):
+                continue
+            bits = lengths
+            for bit, plane in enumerate(counts):
+                bits &= plane if shared >> bit & 1 else ~plane
+            candidates.extend((term_id, shared) for term_id in iter_bits(bits))
+        return candidates
+    
     def smart_search(self, query, max_results=20):
-        """Perform smart search with case-insensitive matching and suggestions"""
+        """Perform smart search with case-insensitive matching and suggestions.
+        
+        Each food is ranked by the best of its exact, partial and fuzzy
+        matches, and only the top max_results are selected.
+        """
         if not query:
             return []
         
         query = query.lower().strip()
-        results = []
         
-        # 1. Exact matches (case-insensitive)
-        exact_matches = self._find_exact_matches(query)
-        results.extend(exact_matches)
+        # Food id -> (total_score, kind, match type code, query_matched, similarity)
+        # of the best match found for each food
+        best = {}
         
-        # 2. Partial matches
-        partial_matches = self._find_partial_matches(query)
-        results.extend(partial_matches)
-        
-        # 3. Fuzzy matches (for typos)
-        fuzzy_matches = self._find_fuzzy_matches(query)
-        results.extend(fuzzy_matches)
-        
-        # Remove duplicates and sort by score
-        seen = set()
-        unique_results = []
-        for result in results:
-            if result['food_name'] not in seen:
-                seen.add(result['food_name'])
-                unique_results.append(result)
+        with self._lock.reading():
+            # 1. Exact matches (case-insensitive)
+            self._find_exact_matches(query, best)
+            
+            # 2. Partial matches
+            self._find_partial_matches(query, best)
+            
+            # 3. Fuzzy matches (for typos)
+            self._find_fuzzy_matches(query, best, max_results)
         
-        # Sort by score (higher is better)
-        unique_results.sort(key=lambda x: x['total_score'], reverse=True)
+        # Highest scores first; ties keep the order the foods were found in
+        ranked = heapq.nlargest(max_results, best.items(), key=lambda item: item[1][0])
         
-        return unique_results[:max_results]
+        results = []
+        for food_id, (total_score, kind, match_type, query_matched, similarity) in ranked:
+            result = {
+                'food_name': self.food_names[food_id],
+                'match_type': kind + self.MATCH_TYPES[match_type],
+                'total_score': total_score,
+                'query_matched': query_matched
+            }
+            if similarity is not None:
+                result['similarity'] = similarity
+            results.append(result)
+        return results
     
-    def _find_exact_matches(self, query):
+    def _find_exact_matches(self, query, best):
         """Find exact matches in the search index"""
-        matches = []
-        
-        if query in self.search_index:
-            for match in self.search_index[query]:
-                matches.append({
-                    'food_name': match['food_name'],
-                    'match_type': 'exact_' + match['match_type'],
-                    'total_score': match['score'] * 2.0,  # Boost exact matches
-                    'query_matched': query
-                })
-        
-        return matches
+        for posting in self.search_index.get(query, ()):
+            food_id = posting >> self.TYPE_BITS
+            match_type = posting & self.TYPE_MASK
+            score = self.MATCH_SCORES[match_type] * 2.0  # Boost exact matches
+            current = best.get(food_id)
+            if current is None or score > current[0]:
+                best[food_id] = (score, 'exact_', match_type, query, None)
     
-    def _find_partial_matches(self, query):
+    def _find_partial_matches(self, query, best):
         """Find partial matches (contains)"""
-        matches = []
-        
-        for term, term_matches in self.search_index.items():
-            if query in term or term in query:
-                for match in term_matches:
-                    # Calculate similarity score
-                    similarity = len(query) / max(len(term), len(query))
-                    score = match['score'] * similarity * 1.5
-                    
-                    matches.append({
-                        'food_name': match['food_name'],
-                        'match_type': 'partial_' + match['match_type'],
-                        'total_score': score,
-                        'query_matched': term
-                    })
-        
-        return matches
-    
-    def _find_fuzzy_matches(self, query):
-        """Find fuzzy matches for typo correction"""
-        matches = []
-        
-        for term in self.search_index.keys():
-            # Use difflib for fuzzy matching
-            similarity = difflib.SequenceMatcher(None, query, term).ratio()
+        # Candidates are visited in index order to keep the ranking stable
+        for term_id in sorted(self._partial_candidates(query)):
+            term = self.terms[term_id]
+            if term is None:
+                continue
+            # Calculate similarity score
+            similarity = len(query) / max(len(term), len(query))
+            
+            for posting in self.search_index.get(term, ()):
+                food_id = posting >> self.TYPE_BITS
+                match_type = posting & self.TYPE_MASK
+                score = self.MATCH_SCORES[match_type] * similarity * 1.5
+                current = best.get(food_id)
+                if current is None or score > current[0]:
+                    best[food_id] = (score, 'partial_', match_type, term, None)
+    
+    def _find_fuzzy_matches(self, query, best, max_results):
+        """Find fuzzy matches for typo correction.
+        
+        Candidates are compared most promising first, and a term is skipped
+        when the match type score times its similarity bound can neither
+        improve on its foods' matches nor reach the max_results best scores
+        so far. A skipped term can still be the first match of a food, which
+        decides its place among ties, so those are looked up for the foods
+        that make it: the top results are the same as comparing every term.
+        """
+        matcher = difflib.SequenceMatcher(None, query)
+        query_length = len(query)
+        
+        # The bound is quick_ratio(), from the characters in common
+        candidates = []
+        for term_id, shared in self._fuzzy_candidates(query):
+            term = self.terms[term_id]
+            if term is None:
+                continue
+            bound = 2.0 * shared / (query_length + len(term))
+            if bound > 0.6:
+                candidates.append((bound, term_id, term))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        
+        # Best score of each food so far, and a heap of the first scores of the
+        # best foods; its smallest score is at most the max_results-th best
+        scores = {food_id: match[0] for food_id, match in best.items()}
+        top = heapq.nlargest(max_results, scores.values())
+        heapq.heapify(top)
+        top_score = max(self.MATCH_SCORES)
+        
+        matches = {}  # term id -> similarity
+        skipped = []
+        for position, (bound, term_id, term) in enumerate(candidates):
+            cutoff = top[0] if top and len(top) >= max_results else 0.0
+            if top_score * bound < cutoff:
+                skipped.extend(term_id for _, term_id, _ in candidates[position:])
+                break
+            postings = self.search_index.get(term, ())
+            if all(self.MATCH_SCORES[posting & self.TYPE_MASK] * bound <
+                   max(cutoff, scores.get(posting >> self.TYPE_BITS, 0.0)) for posting in postings):
+                skipped.append(term_id)
+                continue
+            matcher.set_seq2(term)
+            similarity = matcher.ratio()
             
             if similarity > 0.6:  # Threshold for fuzzy matching
-                for match in self.search_index[term]:
-                    score = match['score'] * similarity
-                    
-                    matches.append({
-                        'food_name': match['food_name'],
-                        'match_type': 'fuzzy_' + match['match_type'],
-                        'total_score': score,
-                        'query_matched': term,
-                        'similarity': similarity
-                    })
-        
-        return matches
+                matches[term_id] = similarity
+                for posting in postings:
+                    food_id = posting >> self.TYPE_BITS
+                    score = self.MATCH_SCORES[posting & self.TYPE_MASK] * similarity
+                    if food_id not in scores:
+                        if len(top) < max_results:
+                            heapq.heappush(top, score)
+                        elif top and score > top[0]:
+                            heapq.heapreplace(top, score)
+                    if score > scores.get(food_id, 0.0):
+                        scores[food_id] = score
+        
+        # First matching term of the new foods in the running for the top results
+        threshold = min(heapq.nlargest(max_results, scores.values()), default=0.0)
+        first = {}
+        for term_id in sorted(matches):
+            for posting in self.search_index.get(self.terms[term_id], ()):
+                food_id = posting >> self.TYPE_BITS
+                if food_id not in best and food_id not in first and scores[food_id] >= threshold:
+                    first[food_id] = term_id
+        if first:
+            latest = max(first.values())
+            for term_id in sorted(skipped):
+                if term_id >= latest:
+                    break
+                postings = self.search_index.get(self.terms[term_id], ())
+                if not any(first.get(posting >> self.TYPE_BITS, -1) > term_id for posting in postings):
+                    continue
+                matcher.set_seq2(self.terms[term_id])
+                similarity = matcher.ratio()
+                if similarity > 0.6:
+                    matches[term_id] = similarity
+                    for posting in postings:
+                        if first.get(posting >> self.TYPE_BITS, -1) > term_id:
+                            first[posting >> self.TYPE_BITS] = term_id
+        
+        # Matches are applied in index order to keep the ranking stable
+        for term_id in sorted(matches):
+            term = self.terms[term_id]
+            for posting in self.search_index.get(term, ()):
+                food_id = posting >> self.TYPE_BITS
+                match_type = posting & self.TYPE_MASK
+                score = self.MATCH_SCORES[match_type] * matches[term_id]
+                current = best.get(food_id)
+                if current is None or score > current[0]:
+                    best[food_id] = (score, 'fuzzy_', match_type, term, matches[term_id])
     
     def suggest_corrections(self, query, max_suggestions=5):
-        """Suggest corrections for misspelled queries"""
+        """Suggest completions and corrections for partial or misspelled queries"""
         if not query:
             return []
         
-        query = query.lower().strip()
-        suggestions = []
-        
-        # Find close matches using difflib
-        close_matches = difflib.get_close_matches(
-            query, 
-            self.food_names_lower, 
-            n=max_suggestions, 
-            cutoff=0.4
-        )
-        
-        for match in close_matches:
-            # Find original case
-            original_index = self.food_names_lower.index(match)
-            original_name = self.food_names[original_index]
+        with self._lock.reading():
+            return self.suggester.suggest(query, max_suggestions)
+
+def popcount(bits):
+    """Number of set bits in a non-negative int"""
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+def to_bitset(ids, size):
+    """Bitset of a list of ids below size"""
+    buffer = bytearray((size + 7) // 8)
+    for position in ids:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+def iter_bits(bits, window=4096):
+    """Positions of the set bits of a non-negative int, in increasing order"""
+    offset = 0
+    mask = (1 << window) - 1
+    while bits:
+        chunk = bits & mask
+        while chunk:
+            lowest = chunk & -chunk
+            yield offset + lowest.bit_length() - 1
+            chunk ^= lowest
+        bits >>= window
+        offset += window
+
+class ClassHierarchy:
+    """Transitive closure of the rdfs:subClassOf hierarchy of the ontology,
+    extended with the parents declared in the ontology_classes of the mappings.
+    
+    Every class maps to the set of itself and all its direct and indirect
+    subclasses, so a class filter matches subclasses with a set lookup
+    instead of a SPARQL round trip.
+    """
+    
+    def __init__(self, parents):
+        children = {}
+        for class_name, class_parents in parents.items():
+            for parent in class_parents:
+                children.setdefault(parent, set()).add(class_name)
+        
+        self.descendants = {}
+        for class_name in set(parents) | set(children):
+            seen = {class_name}
+            stack = [class_name]
+            while stack:
+                for child in children.get(stack.pop(), ()):
+                    if child not in seen:  # also guards against cycles
+                        seen.add(child)
+                        stack.append(child)
+            self.descendants[class_name] = frozenset(seen)
+    
+    @classmethod
+    def load(cls, ontology_file, ontology_classes):
+        """Hierarchy of the classes of an RDF/XML ontology and of the mappings"""
+        parents = {}
+        graph = Graph()
+        try:
+            graph.parse(ontology_file, format='xml')
+        except Exception as e:
+            logging.error(f"Error loading ontology {ontology_file}: {e}")
+            print(f"⚠️ Could not load ontology {ontology_file}, using the mappings classes only: {e}")
+        
+        def local_name(uri):
+            return str(uri)[len(ONTOLOGY_NS):] if str(uri).startswith(ONTOLOGY_NS) else None
+        
+        for class_uri in graph.subjects(RDF.type, OWL.Class):
+            if local_name(class_uri):
+                parents.setdefault(local_name(class_uri), set())
+        for class_uri, parent_uri in graph.subject_objects(RDFS.subClassOf):
+            if local_name(class_uri) and local_name(parent_uri):
+                parents.setdefault(local_name(class_uri), set()).add(local_name(parent_uri))
+        
+        for class_name, class_info in ontology_classes.items():
+            parents.setdefault(class_name, set())
+            if class_info.get('parent'):
+                parents[class_name].add(class_info['parent'])
+        return cls(parents)
+    
+    def subclasses(self, class_name):
+        """The class and all its direct and indirect subclasses"""
+        return self.descendants.get(class_name, frozenset([class_name]))
+
+class FacetIndex:
+    """Inverted indexes over the facet fields of the catalogue.
+    
+    Foods get ids in name order, and every facet value maps to an int used as
+    a bitset of the ids carrying it, so that filtering is a few bitwise ANDs
+    and counting a popcount, whatever the size of the catalogue. With a class
+    hierarchy, an ontology_class also covers the foods of its subclasses.
+    """
+    
+    WINDOW = 4096  # bits decoded at a time when walking a bitset
+    MAX_SHIFTS = 256  # more added and removed foods than this are rebuilt from scratch
+    
+    def __init__(self, food_mappings, class_hierarchy=None):
+        self.class_hierarchy = class_hierarchy
+        self.names = sorted(food_mappings)
+        self.all_bits = (1 << len(self.names)) - 1
+        self.bitsets = {field: {} for field in FACET_FIELDS}
+        
+        postings = {field: {} for field in FACET_FIELDS}
+        for food_id, food_name in enumerate(self.names):
+            properties = food_mappings[food_name]
+            for field in FACET_FIELDS:
+                value = properties.get(field)
+                if isinstance(value, str) and value:
+                    postings[field].setdefault(value, []).append(food_id)
+        
+        for field, values in postings.items():
+            for value, food_ids in values.items():
+                self.bitsets[field][value] = self._to_bitset(food_ids)
+        
+        if class_hierarchy is not None:
+            direct = self.bitsets['ontology_class']
+            expanded = {}
+            for class_name in set(direct) | set(class_hierarchy.descendants):
+                bits = 0
+                for subclass in class_hierarchy.subclasses(class_name):
+                    bits |= direct.get(subclass, 0)
+                if bits:
+                    expanded[class_name] = bits
+            self.bitsets['ontology_class'] = expanded
+    
+    def _to_bitset(self, food_ids):
+        """Bitset of a list of food ids"""
+        buffer = bytearray((len(self.names) + 7) // 8)
+        for food_id in food_ids:
+            buffer[food_id >> 3] |= 1 << (food_id & 7)
+        return int.from_bytes(buffer, 'little')
+    
+    def updated(self, old_mappings, food_mappings, changed, added, removed):
+        """Copy of the index with the changed, added and removed foods applied.
+        
+        Only the bits of those foods are set or cleared. Adding or removing
+        a food also shifts the ids after it in every bitset, so more than
+        MAX_SHIFTS of them are rebuilt from scratch instead.
+        """
+        if len(added) + len(removed) > self.MAX_SHIFTS:
+            return FacetIndex(food_mappings, self.class_hierarchy)
+        
+        index = FacetIndex.__new__(FacetIndex)
+        index.class_hierarchy = self.class_hierarchy
+        index.names = list(self.names)
+        index.bitsets = {field: dict(values) for field, values in self.bitsets.items()}
+        for food_name in changed:
+            index._set_food(food_name, old_mappings[food_name], False)
+        for food_name in removed:
+            index._shift(bisect.bisect_left(index.names, food_name), -1)
+        for food_name in sorted(added):
+            index._shift(bisect.bisect_left(index.names, food_name), 1, food_name)
+        for food_name in changed + added:
+            index._set_food(food_name, food_mappings[food_name], True)
+        
+        index.all_bits = (1 << len(index.names)) - 1
+        for field, values in index.bitsets.items():
+            index.bitsets[field] = {value: bits for value, bits in values.items() if bits}
+        return index
+    
+    def _set_food(self, food_name, properties, present):
+        """Set or clear the bit of a food for each of its facet values"""
+        bit = 1 << bisect.bisect_left(self.names, food_name)
+        for field in FACET_FIELDS:
+            value = properties.get(field)
+            if not (isinstance(value, str) and value):
+                continue
+            keys = [value]
+            if field == 'ontology_class' and self.class_hierarchy is not None:
+                # The class also counts for every class it is a subclass of
+                keys += [class_name for class_name, subclasses in self.class_hierarchy.descendants.items()
+                         if value in subclasses and class_name != value]
+            values = self.bitsets[field]
+            for key in keys:
+                bits = values.get(key, 0)
+                values[key] = bits | bit if present else bits & ~bit
+    
+    def _shift(self, food_id, step, food_name=None):
+        """Insert food_name at food_id with step 1, or remove the food at food_id
+        with step -1, moving the ids after it in every bitset"""
+        low = (1 << food_id) - 1
+        for values in self.bitsets.values():
+            for value, bits in values.items():
+                if step > 0:
+                    values[value] = bits & low | bits >> food_id << food_id + 1
+                else:
+                    values[value] = bits & low | bits >> food_id + 1 << food_id
+        if step > 0:
+            self.names.insert(food_id, food_name)
+        else:
+            del self.names[food_id]
+    
+    def match(self, filters):
+        """Bitset of the foods having every {field: value} in filters"""
+        bits = self.all_bits
+        for field, value in filters.items():
+            bits &= self.bitsets[field].get(value, 0)
+        return bits
+    
+    def counts(self, bits):
+        """Number of foods in a bitset for each value of each facet"""
+        facets = {}
+        for field, values in self.bitsets.items():
+            field_counts = {value: popcount(bits & value_bits) for value, value_bits in values.items()}
+            facets[field] = {value: count for value, count in
+                             sorted(field_counts.items(), key=lambda item: (-item[1], item[0])) if count}
+        return facets
+    
+    def page(self, bits, start, limit):
+        """Names of up to limit foods in a bitset from id start on, and the id
+        to resume from, or None when the bitset is exhausted"""
+        names = []
+        bits >>= start
+        offset = start
+        mask = (1 << self.WINDOW) - 1
+        while bits:
+            window = bits & mask
+            while window:
+                lowest = window & -window
+                food_id = offset + lowest.bit_length() - 1
+                if len(names) == limit:
+                    return names, food_id
+                names.append(self.names[food_id])
+                window ^= lowest
+            bits >>= self.WINDOW
+            offset += self.WINDOW
+        return names, None
+    
+    def position(self, food_name):
+        """Id of the first food sorting at or after food_name"""
+        return bisect.bisect_left(self.names, food_name)
+
+ImageEntry = namedtuple('ImageEntry', ['filename', 'path', 'size', 'mtime'])
+# Response entry of a food with relative image URLs, and its serialization split where the base URL goes
+FoodRecord = namedtuple('FoodRecord', ['data', 'json_parts'])
+
+class ImageManifest:
+    """In-memory listing of the food image folders, refreshed by mtime polling"""
+    
+    def __init__(self, images_path, poll_interval=IMAGE_MANIFEST_POLL_INTERVAL):
+        self.images_path = images_path
+        self.poll_interval = poll_interval
+        self.folders = {}  # food name -> sorted list of ImageEntry
+        self.version = 0  # bumped whenever the listing changes
+        self._folder_mtimes = {}
+        self._root_mtime = None
+        self._lock = threading.Lock()
+        self._poller = None
+        self.refresh()
+    
+    def get(self, food_name):
+        """Sorted images of a food, or None if it has no image folder"""
+        return self.folders.get(food_name)
+    
+    def refresh(self):
+        """Rescan the image folders whose mtime changed since the last scan"""
+        with self._lock:
+            scan_start = time.perf_counter()
+            try:
+                root_mtime = os.stat(self.images_path).st_mtime_ns
+            except OSError:
+                if self.folders:
+                    self.version += 1
+                self.folders, self._folder_mtimes, self._root_mtime = {}, {}, None
+                return
             
-            similarity = difflib.SequenceMatcher(None, query, match).ratio()
-            suggestions.append({
-                'suggestion': original_name,
-                'similarity': similarity,
-                'type': 'spelling_correction'
-            })
-        
-        # Also check search terms
-        for term in self.search_index.keys():
-            similarity = difflib.SequenceMatcher(None, query, term).ratio()
-            if 0.5 < similarity < 0.9:  # Not too similar (already found) but not too different
-                suggestions.append({
-                    'suggestion': term,
-                    'similarity': similarity,
-                    'type': 'search_term'
-                })
-        
-        # Sort by similarity and remove duplicates
-        suggestions = sorted(suggestions, key=lambda x: x['similarity'], reverse=True)
-        seen = set()
-        unique_suggestions = []
-        for sugg in suggestions:
-            if sugg['suggestion'] not in seen:
-                seen.add(sugg['suggestion'])
-                unique_suggestions.append(sugg)
+            folder_names = list(self.folders)
+            if root_mtime != self._root_mtime:
+                folder_names = [name for name in os.listdir(self.images_path)
+                                if os.path.isdir(os.path.join(self.images_path, name))]
+            
+            folders = {}
+            folder_mtimes = {}
+            for food_name in folder_names:
+                image_dir = os.path.join(self.images_path, food_name)
+                try:
+                    mtime = os.stat(image_dir).st_mtime_ns
+                    if self._folder_mtimes.get(food_name) == mtime:
+                        folders[food_name] = self.folders[food_name]
+                    else:
+                        folders[food_name] = self._scan_folder(image_dir)
+                except OSError:
+                    continue
+                folder_mtimes[food_name] = mtime
+            
+            if folder_mtimes != self._folder_mtimes:
+                self.version += 1
+                record_index_build('image_manifest', time.perf_counter() - scan_start)
+            
+            # Swap in the new listing at once so readers never need the lock
+            self.folders, self._folder_mtimes, self._root_mtime = folders, folder_mtimes, root_mtime
+    
+    def verify(self, food_name, image):
+        """An image of a food checked against its file, before it is served.
         
-        return unique_suggestions[:max_suggestions]
+        A file replaced in place leaves the mtime of its folder alone, so
+        when its size or mtime no longer match the folder is rescanned.
+        Returns the up to date entry, or None if the file is gone.
+        """
+        try:
+            stat = os.stat(image.path)
+            if stat.st_size == image.size and stat.st_mtime == image.mtime:
+                return image
+        except OSError:
+            pass
+        
+        with self._lock:
+            try:
+                images = self._scan_folder(os.path.join(self.images_path, food_name))
+            except OSError:
+                return None  # the folder is gone too, which the next refresh picks up
+            self.folders[food_name] = images
+            self.version += 1
+        return next((entry for entry in images if entry.filename == image.filename), None)
+    
+    def _scan_folder(self, image_dir):
+        """List the images of a folder in a consistent order"""
+        entries = []
+        for filename in sorted(os.listdir(image_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(image_dir, filename)
+            stat = os.stat(path)
+            entries.append(ImageEntry(filename, path, stat.st_size, stat.st_mtime))
+        return entries
+    
+    def start_polling(self):
+        """Keep the manifest up to date from a background thread"""
+        if self._poller is not None or not self.poll_interval:
+            return
+        self._poller = start_poller('image-manifest-poller', self.poll_interval, self.refresh)
+
+class ImageVariantCache:
+    """Resized image variants generated with Pillow, kept in a content-addressed disk cache.
+    
+    The cache is shared by every worker and bounded to max_bytes: variants
+    are marked as used through their mtime, and the least recently used ones
+    are evicted when a measurement of the cache finds it over the limit.
+    """
+    
+    def __init__(self, cache_path, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self._known_paths = OrderedDict()  # variant path -> when this process last touched it
+        self._generated = 0
+        self._lock = threading.Lock()
+    
+    def get(self, image, width=None, height=None, image_format=None):
+        """Path and mimetype of a variant of an image, generating it on first use"""
+        if image_format is None:
+            image_format = 'jpeg' if image.filename.lower().endswith(('.jpg', '.jpeg')) else 'png'
+        pil_format, mimetype, extension = IMAGE_VARIANT_FORMATS[image_format]
+        
+        # The key covers the source version, so an updated image gets new variants
+        key = hashlib.sha1(
+            f"{image.path}|{image.size}|{image.mtime}|{width}|{height}|{image_format}".encode('utf-8')
+        ).hexdigest()
+        variant_path = os.path.join(self.cache_path, key[:2], key + extension)
+        
+        now = time.time()
+        touched = self._known_paths.get(variant_path)
+        if touched is None or now - touched > IMAGE_CACHE_TOUCH_INTERVAL:
+            try:
+                os.utime(variant_path)  # also tells whether another worker evicted it
+            except FileNotFoundError:
+                self._generate(image.path, variant_path, width, height, pil_format)
+            self._remember(variant_path, now)
+        
+        return variant_path, mimetype
+    
+    def forget(self, variant_path):
+        """Drop a variant found evicted, so the next get() generates it again"""
+        with self._lock:
+            self._known_paths.pop(variant_path, None)
+    
+    def _remember(self, variant_path, touched):
+        with self._lock:
+            self._known_paths[variant_path] = touched
+            self._known_paths.move_to_end(variant_path)
+            while len(self._known_paths) > IMAGE_CACHE_KNOWN_PATHS:
+                self._known_paths.popitem(last=False)
+    
+    def _sweep(self, keep):
+        """Evict the least recently used variants but keep while the cache is over max_bytes"""
+        variants = []
+        total = 0
+        for root, _, filenames in os.walk(self.cache_path):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if filename.endswith('.tmp') or path == keep:
+                    continue  # still being written, or about to be sent
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another worker meanwhile
+                variants.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        
+        if total <= self.max_bytes:
+            return
+        variants.sort()
+        for _, size, path in variants:
+            # Evict down to 90% of the limit, so that the next sweeps have nothing to do
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.forget(path)
+    
+    def _generate(self, source_path, variant_path, width, height, pil_format):
+        """Resize an image and write it atomically into the cache"""
+        variant_dir = os.path.dirname(variant_path)
+        os.makedirs(variant_dir, exist_ok=True)
+        
+        with Image.open(source_path) as img:
+            # thumbnail() keeps the aspect ratio and never upscales
+            img.thumbnail((width or IMAGE_VARIANT_MAX_SIZE, height or IMAGE_VARIANT_MAX_SIZE))
+            if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            elif img.mode == 'P':
+                img = img.convert('RGBA')
+            
+            # Write to a temporary file first so concurrent requests never see a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=variant_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    img.save(f, format=pil_format, quality=80)
+                os.replace(tmp_path, variant_path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        
+        with self._lock:
+            self._generated += 1
+            sweep = (self._generated - 1) % IMAGE_CACHE_SWEEP_EVERY == 0  # first one included
+        if sweep:
+            self._sweep(variant_path)
+
+class OntologyExportCache:
+    """Serialized ontology exports kept on disk, one file per format and data version.
+    
+    Versions are content hashes, so workers that loaded the same data share
+    files. Each export only drops the files written before its own data was
+    loaded, which leaves those of workers that already reloaded alone.
+    """
+    
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+    
+    def path(self, version, export_format):
+        """Where the export of a data version is cached in a format"""
+        extension = ONTOLOGY_EXPORT_FORMATS[export_format][2]
+        return os.path.join(self.cache_path, f"ontology-{version}{extension}")
+    
+    def _create_temp(self):
+        """Open a temporary file in the cache, or return None if the cache is not writable"""
+        try:
+            os.makedirs(self.cache_path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_path, suffix='.tmp')
+        except OSError as e:
+            logging.error(f"Ontology export cache not writable: {e}")
+            return None
+        return os.fdopen(fd, 'wb'), tmp_path
+    
+    def _publish(self, tmp_path, path, loaded_at):
+        """Move a complete export into place and drop the other versions of its
+        format written before its data was loaded at loaded_at"""
+        os.replace(tmp_path, path)
+        extension = os.path.splitext(path)[1]
+        for name in os.listdir(self.cache_path):
+            if not name.endswith(extension) or name == os.path.basename(path):
+                continue
+            try:
+                other = os.path.join(self.cache_path, name)
+                if os.stat(other).st_mtime < loaded_at:
+                    os.unlink(other)
+            except OSError:
+                pass  # already removed by another worker
+    
+    def store(self, path, data, loaded_at):
+        """Write an export atomically; returns whether it was cached"""
+        temp = self._create_temp()
+        if temp is None:
+            return False
+        f, tmp_path = temp
+        try:
+            with f:
+                f.write(data)
+            self._publish(tmp_path, path, loaded_at)
+        except OSError as e:
+            logging.error(f"Error caching ontology export: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
+        return True
+    
+    def write_through(self, path, chunks, loaded_at):
+        """Pass chunks through while writing them to the cache.
+        
+        The file only replaces path once every chunk was sent, so an
+        interrupted download never leaves a partial export behind.
+        """
+        temp = self._create_temp()
+        if temp is None:
+            yield from chunks
+            return
+        f, tmp_path = temp
+        try:
+            with f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            self._publish(tmp_path, path, loaded_at)
+        except BaseException:  # including GeneratorExit when the client goes away
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
 
 class FoodSemanticService:
     def __init__(self):
+        self.mappings_hash = None  # content hash of the mappings file the loaded data came from
+        self.mappings_loaded_at = time.time()  # when data of that content was first loaded
         self.config = self._load_mappings_config()
         self.food_mappings = self.config.get('food_mappings', {})
         self.ontology_classes = self.config.get('ontology_classes', {})
@@ -292,22 +1883,110 @@ class FoodSemanticService:
         self.nutritional_categories = self.config.get('nutritional_categories', [])
         self.preparation_methods = self.config.get('preparation_methods', [])
         
-        # Initialize smart search engine
-        self.smart_search = SmartSearchEngine(self.food_mappings)
-        
-        # Only index if Elasticsearch is available
-        if es is not None:
-            self._index_foods_in_elasticsearch()
-        else:
-            print("⚠️ Skipping Elasticsearch indexing - service not available")
+        # Per-food content hashes of the loaded mappings, diffed on reload
+        self.food_hashes = {name: self._food_hash(properties) for name, properties in self.food_mappings.items()}
+        self.generation = 0  # bumped whenever the loaded data changes
+        self._reload_lock = threading.Lock()
+        self._publisher_lock = None
+        self._publisher_lock_guard = threading.Lock()
+        self._mappings_mtime = self._get_mappings_mtime()
+        # Last seen content of the reload signal files
+        self._reload_requested = self._read_signal(RELOAD_REQUEST_FILE)
+        self._reload_published = self._read_signal(RELOAD_PUBLISHED_FILE)
+        # Foods whose changes Elasticsearch or Fuseki have not taken yet, retried on the next poll
+        self._unpublished = {'elasticsearch': set(), 'fuseki': set()}
+        self._rematerialize_pending = False
+        # Digests of the Elasticsearch documents of the foods, summed into the
+        # catalogue hash; those of stale foods are recomputed when it is needed
+        self._elasticsearch_digests = {}
+        self._elasticsearch_digest_sum = 0
+        self._elasticsearch_stale = set(self.food_mappings)
+        self._elasticsearch_digest_lock = threading.Lock()
+        
+        # Initialize smart search engine, from the snapshot of these mappings if there is one
+        self.smart_search = self._load_search_snapshot()
+        if self.smart_search is None:
+            build_start = time.perf_counter()
+            self.smart_search = SmartSearchEngine(self.food_mappings)
+            record_index_build('smart_search', time.perf_counter() - build_start)
+            self._write_search_snapshot()
+        build_start = time.perf_counter()
+        self.class_hierarchy = ClassHierarchy.load(ONTOLOGY_FILE, self.ontology_classes)
+        record_index_build('class_hierarchy', time.perf_counter() - build_start)
+        print(f"✅ Loaded class hierarchy ({len(self.class_hierarchy.descendants)} classes)")
+        build_start = time.perf_counter()
+        self.facets = FacetIndex(self.food_mappings, self.class_hierarchy)
+        record_index_build('facets', time.perf_counter() - build_start)
+        self.search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self.food_records = TTLCache(FOOD_RECORD_CACHE_SIZE, FOOD_RECORD_CACHE_TTL)
+        
+        # Scan the image folders once, then keep the listing fresh in the background
+        self.image_manifest = ImageManifest(IMAGES_PATH)
+        self.image_variants = ImageVariantCache(IMAGE_CACHE_PATH)
+        self.ontology_exports = OntologyExportCache(ONTOLOGY_EXPORT_CACHE_PATH)
+        print(f"✅ Indexed images for {len(self.image_manifest.folders)} foods")
+        
+        # Searches use the smart search engine until the Elasticsearch index is ready,
+        # and while the breaker is open
+        self.elasticsearch_ready = threading.Event()
+        self.elasticsearch_breaker = CircuitBreaker(ES_BREAKER_FAILURE_THRESHOLD, ES_BREAKER_RESET_TIMEOUT)
+    
+    def start_pollers(self):
+        """Connect to Elasticsearch and keep the image listing and the mappings
+        fresh from background threads.
+        
+        Threads do not survive a fork, so each server process starts its own.
+        """
+        threading.Thread(target=self._prepare_elasticsearch, name='elasticsearch-setup', daemon=True).start()
+        self.image_manifest.start_polling()
+        
+        # Pick up edits to the mappings file without a restart
+        if MAPPINGS_WATCH_INTERVAL:
+            start_poller('mappings-watcher', MAPPINGS_WATCH_INTERVAL, self._reload_if_modified)
+        # Reloads asked for through the admin endpoint, and published by the publisher
+        start_poller('reload-signals', RELOAD_SIGNAL_INTERVAL, self._poll_reload_signals)
+    
+    def _read_mappings_file(self):
+        """Read and parse the JSON configuration file; returns it with the hash of its content"""
+        with open(MAPPINGS_FILE, 'rb') as f:
+            content = f.read()
+        return json.loads(content), hashlib.sha1(content).hexdigest()
+    
+    def _search_snapshot_path(self):
+        return os.path.splitext(MAPPINGS_FILE)[0] + SEARCH_SNAPSHOT_SUFFIX
+    
+    def _load_search_snapshot(self):
+        """Search engine mapped in from the snapshot of the loaded mappings, or None"""
+        if self.mappings_hash is None:
+            return None
+        try:
+            load_start = time.perf_counter()
+            engine = SmartSearchEngine.load_snapshot(self._search_snapshot_path(), self.food_mappings,
+                                                     self.mappings_hash)
+        except Exception as e:
+            logging.error(f"Error loading search index snapshot: {e}")
+            return None
+        if engine is not None:
+            record_index_build('smart_search_snapshot', time.perf_counter() - load_start)
+            print(f"✅ Loaded search index snapshot ({len(engine.terms)} terms)")
+        return engine
+    
+    def _write_search_snapshot(self):
+        """Save the freshly built search engine for the next start"""
+        if self.mappings_hash is None:
+            return
+        try:
+            self.smart_search.write_snapshot(self._search_snapshot_path(), self.mappings_hash)
+        except Exception as e:
+            logging.error(f"Error writing search index snapshot: {e}")
+            print(f"⚠️ Could not write search index snapshot: {e}")
     
     def _load_mappings_config(self):
         """Load food mappings from JSON configuration file"""
         try:
-            with open(MAPPINGS_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                print(f"✅ Loaded {len(config.get('food_mappings', {}))} food mappings from JSON")
-                return config
+            config, self.mappings_hash = self._read_mappings_file()
+            print(f"✅ Loaded {len(config.get('food_mappings', {}))} food mappings from JSON")
+            return config
         except FileNotFoundError:
             logging.error(f"Mappings file not found: {MAPPINGS_FILE}")
             print(f"❌ Mappings file not found: {MAPPINGS_FILE}")
@@ -317,32 +1996,365 @@ class FoodSemanticService:
             print(f"❌ Error parsing mappings file: {e}")
             return {'food_mappings': {}}
     
-    def get_food_mapping(self, food_name):
-        """Get mapping for a specific food"""
-        return self.food_mappings.get(food_name, {
-            'ontology_class': 'Food',
-            'food_type': 'Unknown',
-            'category': 'Unknown',
-            'region': 'Unknown'
-        })
+    def _get_mappings_mtime(self):
+        """Modification time of the mappings file, or None if it is missing"""
+        try:
+            return os.stat(MAPPINGS_FILE).st_mtime_ns
+        except OSError:
+            return None
     
-    def get_food_image_info(self, food_name):
-        """Get comprehensive image information for a food"""
-        image_dir = os.path.join(IMAGES_PATH, food_name)
+    def _food_hash(self, properties):
+        """Content hash of a food entry"""
+        return hashlib.sha1(json.dumps(properties, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _reload_if_modified(self):
+        """Reload the mappings if the file changed since it was last loaded, and
+        retry the changes Elasticsearch or Fuseki failed to take.
+        
+        Only the publisher watches the file; the other workers reload once it
+        has written the changes through (see _poll_reload_signals).
+        """
+        if not self._holds_publisher_lock():
+            return
+        mtime = self._get_mappings_mtime()
+        if mtime is not None and mtime != self._mappings_mtime:
+            summary = self.reload()
+            print(f"🔄 Reloaded mappings: {len(summary['added'])} added, "
+                  f"{len(summary['changed'])} changed, {len(summary['removed'])} removed")
+        elif self._has_unpublished():
+            with self._reload_lock:
+                statuses = self._publish_pending()
+                self.search_cache.clear()
+                sparql.invalidate()
+                if any(status != "unchanged" for status in statuses.values()):
+                    self._signal_published()
+            print(f"🔁 Retried publishing reloaded foods: {statuses}")
+    
+    def request_reload(self):
+        """Reload asked for through the admin endpoint. The publisher reloads
+        right away and returns the summary; any other worker asks it to and
+        returns None, and reloads itself once the changes are published."""
+        if self._holds_publisher_lock():
+            return self.reload()
+        self._write_signal(RELOAD_REQUEST_FILE)
+        return None
+    
+    def _poll_reload_signals(self):
+        """Reload when another worker asked the publisher to, or, in the other
+        workers, when the publisher has written a reload through"""
+        if self._holds_publisher_lock():
+            requested = self._read_signal(RELOAD_REQUEST_FILE)
+            if requested != self._reload_requested:
+                self._reload_requested = requested
+                summary = self.reload()
+                print(f"🔄 Reloaded mappings on request: {len(summary['added'])} added, "
+                      f"{len(summary['changed'])} changed, {len(summary['removed'])} removed")
+            return
         
-        if not os.path.exists(image_dir):
-            return {
-                'has_images': False,
-                'image_count': 0,
-                'image_urls': [],
-                'thumbnail_url': None
+        published = self._read_signal(RELOAD_PUBLISHED_FILE)
+        if published != self._reload_published:
+            self._reload_published = published
+            summary = self.reload()
+            # Elasticsearch and Fuseki changed under responses cached since the last reload
+            self.search_cache.clear()
+            sparql.invalidate()
+            print(f"🔄 Reloaded mappings published by another worker: {len(summary['added'])} added, "
+                  f"{len(summary['changed'])} changed, {len(summary['removed'])} removed")
+    
+    def _read_signal(self, path):
+        """Content of a reload signal file, or None before it was first written"""
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _write_signal(self, path):
+        """Rewrite a reload signal file with new content, atomically"""
+        signal = f"{os.getpid()}-{time.time_ns()}"
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(signal)
+        os.replace(tmp_path, path)
+        return signal
+    
+    def _signal_published(self):
+        """Tell the other workers to reload, now that the changes are written through"""
+        try:
+            self._reload_published = self._write_signal(RELOAD_PUBLISHED_FILE)
+        except OSError as e:
+            logging.error(f"Error signalling a published reload: {e}")
+    
+    def _has_unpublished(self):
+        """Whether Elasticsearch or Fuseki still miss changes from an earlier reload"""
+        return any(self._unpublished.values()) or self._rematerialize_pending
+    
+    def _publish_pending(self):
+        """Write the foods Elasticsearch and Fuseki have not taken yet through to them.
+        
+        A backend's pending foods are only dropped once its update succeeded, so
+        a failed update is retried with the current data of those foods.
+        """
+        statuses = {}
+        for backend, update in (('elasticsearch', self._update_elasticsearch),
+                                ('fuseki', self._update_knowledge_base)):
+            pending = set(self._unpublished[backend])
+            rematerialize = backend == 'fuseki' and self._rematerialize_pending
+            if not pending and not rematerialize:
+                statuses[backend] = "unchanged"
+                continue
+            
+            upserts = {name: self.food_mappings[name] for name in pending if name in self.food_mappings}
+            removed = [name for name in pending if name not in self.food_mappings]
+            if backend == 'fuseki':
+                statuses[backend] = update(upserts, removed, rematerialize)
+            else:
+                statuses[backend] = update(upserts, removed)
+            
+            # Without Elasticsearch, the background indexing compares catalogue hashes once it connects
+            if statuses[backend] in ("updated", "reindexed", "unavailable", "left to the background indexing"):
+                self._unpublished[backend] -= pending
+                if rematerialize:
+                    self._rematerialize_pending = False
+        return statuses
+    
+    def reload(self):
+        """Reload the mappings file and apply only the foods that were added,
+        changed or removed to the search index, Elasticsearch and Fuseki.
+        
+        The class hierarchy is reloaded too, from the ontology and the mappings.
+        """
+        with self._reload_lock:
+            start_time = time.time()
+            mtime = self._get_mappings_mtime()
+            config, mappings_hash = self._read_mappings_file()
+            self._mappings_mtime = mtime
+            
+            food_mappings = config.get('food_mappings', {})
+            food_hashes = {name: self._food_hash(properties) for name, properties in food_mappings.items()}
+            
+            added = [name for name in food_hashes if name not in self.food_hashes]
+            changed = [name for name, food_hash in food_hashes.items()
+                       if name in self.food_hashes and self.food_hashes[name] != food_hash]
+            removed = [name for name in self.food_hashes if name not in food_hashes]
+            foods_changed = bool(added or changed or removed)
+            
+            class_hierarchy = ClassHierarchy.load(ONTOLOGY_FILE, config.get('ontology_classes', {}))
+            hierarchy_changed = class_hierarchy.descendants != self.class_hierarchy.descendants
+            
+            # Changed foods are removed with their old terms, then added back;
+            # searches wait until every change is in
+            with self.smart_search.updating():
+                for food_name in changed + removed:
+                    self.smart_search.remove_food(food_name, self.food_mappings[food_name])
+                for food_name in changed + added:
+                    self.smart_search.add_food(food_name, food_mappings[food_name])
+            
+            previous_mappings = self.food_mappings
+            self.config = config
+            with self._elasticsearch_digest_lock:
+                self.food_mappings = food_mappings
+                self._elasticsearch_stale.update(changed + added + removed)
+            self.smart_search.food_mappings = food_mappings
+            self.ontology_classes = config.get('ontology_classes', {})
+            self.regions = config.get('regions', [])
+            self.nutritional_categories = config.get('nutritional_categories', [])
+            self.preparation_methods = config.get('preparation_methods', [])
+            self.food_hashes = food_hashes
+            self.class_hierarchy = class_hierarchy
+            mappings_changed = mappings_hash != self.mappings_hash
+            # Only switched once the data it describes is in place (see export_ontology)
+            if mappings_changed:
+                self.mappings_loaded_at = time.time()
+                self.mappings_hash = mappings_hash
+            if foods_changed or hierarchy_changed:
+                build_start = time.perf_counter()
+                if hierarchy_changed:
+                    self.facets = FacetIndex(food_mappings, class_hierarchy)
+                else:
+                    self.facets = self.facets.updated(previous_mappings, food_mappings, changed, added, removed)
+                record_index_build('facets', time.perf_counter() - build_start)
+                self.generation += 1
+            
+            summary = {
+                "added": added,
+                "changed": changed,
+                "removed": removed,
+                "class_hierarchy": "changed" if hierarchy_changed else "unchanged",
+                "elasticsearch": "unchanged",
+                "fuseki": "unchanged"
             }
+            
+            if foods_changed or hierarchy_changed:
+                # Every worker reloads its own indexes, but only one writes the changes through
+                if self._holds_publisher_lock():
+                    for backend in self._unpublished.values():
+                        backend.update(changed + added + removed)
+                    # A new class hierarchy changes the inferred triples of every food
+                    self._rematerialize_pending |= hierarchy_changed
+                    summary.update(self._publish_pending())
+                else:
+                    if foods_changed:
+                        summary["elasticsearch"] = "left to the publishing worker"
+                    summary["fuseki"] = "left to the publishing worker"
+                # Drop responses cached while Elasticsearch and Fuseki were being updated,
+                # or filtered along the previous class hierarchy
+                self.search_cache.clear()
+                sparql.invalidate()
+            
+            if self._publisher_lock is not None and (mappings_changed or foods_changed or hierarchy_changed):
+                self._signal_published()
+            
+            summary["generation"] = self.generation
+            summary["duration_ms"] = round((time.time() - start_time) * 1000, 2)
+            record_index_build('reload', time.time() - start_time)
+            return summary
+    
+    def use_elasticsearch(self):
+        """Whether searches should go to Elasticsearch"""
+        return es is not None and self.elasticsearch_ready.is_set()
+    
+    def _prepare_elasticsearch(self):
+        """Connect to Elasticsearch and get the index up to date, retrying with
+        exponential backoff until both are done"""
+        global es, es_search
+        delay = ES_CONNECT_INITIAL_DELAY
+        while True:
+            if es is None:
+                es = connect_elasticsearch()
+                if es is not None:
+                    es_search = create_elasticsearch_client(max_retries=0)
+            
+            if es is not None:
+                try:
+                    if self._elasticsearch_up_to_date():
+                        self.elasticsearch_ready.set()
+                        self.search_cache.clear()
+                        print("✅ Elasticsearch index ready, switching searches over")
+                        return
+                    # Only one process builds the index; the others wait for it
+                    if self._holds_publisher_lock() and self._index_foods_in_elasticsearch():
+                        continue  # the mappings may have been reloaded during the build
+                except Exception as e:
+                    logging.error(f"Error preparing Elasticsearch: {e}")
+            
+            print(f"⏳ Elasticsearch not ready yet, retrying in {delay} seconds...")
+            time.sleep(delay)
+            delay = min(delay * 2, ES_CONNECT_MAX_DELAY)
+    
+    def _elasticsearch_catalogue_hash(self):
+        """Content hash of the documents the index should hold.
+        
+        It is the sum of per-document digests, so a reload only recomputes
+        the digests of the foods it changed, added or removed.
+        """
+        with self._elasticsearch_digest_lock:
+            food_mappings = self.food_mappings
+            for food_name in self._elasticsearch_stale:
+                self._elasticsearch_digest_sum -= self._elasticsearch_digests.pop(food_name, 0)
+                if food_name in food_mappings:
+                    document = self._elasticsearch_document(food_name, food_mappings[food_name])
+                    digest = hashlib.sha1(json.dumps(document, sort_keys=True).encode('utf-8')).digest()
+                    self._elasticsearch_digests[food_name] = int.from_bytes(digest, 'big')
+                    self._elasticsearch_digest_sum += self._elasticsearch_digests[food_name]
+            self._elasticsearch_stale = set()
+            return hashlib.sha1(f"{ES_INDEX_VERSION}:{self._elasticsearch_digest_sum:x}".encode('utf-8')).hexdigest()
+    
+    def _elasticsearch_up_to_date(self):
+        """Whether the index behind the search alias holds the current catalogue"""
+        if not es.indices.exists_alias(name=ES_INDEX_ALIAS):
+            return False
+        mappings = es.indices.get_mapping(index=ES_INDEX_ALIAS)
+        catalogue_hash = self._elasticsearch_catalogue_hash()
+        return all(mapping['mappings'].get('_meta', {}).get('catalogue_hash') == catalogue_hash
+                   for mapping in mappings.values())
+    
+    def _holds_publisher_lock(self):
+        """Whether this process writes reloads through to Elasticsearch and Fuseki.
+        
+        The first process to take the lock keeps it until it exits, after
+        which the next one to reload takes over.
+        """
+        with self._publisher_lock_guard:
+            if self._publisher_lock is None:
+                lock_file = open(PUBLISHER_LOCK_FILE, 'a')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+                self._publisher_lock = lock_file
+            return True
+    
+    def _update_elasticsearch(self, upserts, removed):
+        """Write changed foods to the live Elasticsearch index"""
+        if es is None:
+            return "unavailable"
+        if not self.elasticsearch_ready.is_set():
+            return "left to the background indexing"
+        
+        try:
+            # Without a live index there is nothing to patch, so build one
+            if not es.indices.exists_alias(name=ES_INDEX_ALIAS):
+                self._index_foods_in_elasticsearch()
+                return "reindexed"
+            
+            actions = [
+                {
+                    "_op_type": "index",
+                    "_index": ES_INDEX_ALIAS,
+                    "_id": self._elasticsearch_doc_id(food_name),
+                    "_source": self._elasticsearch_document(food_name, properties)
+                }
+                for food_name, properties in upserts.items()
+            ]
+            actions.extend(
+                {"_op_type": "delete", "_index": ES_INDEX_ALIAS, "_id": self._elasticsearch_doc_id(food_name)}
+                for food_name in removed
+            )
+            _, errors = helpers.bulk(
+                es, actions, chunk_size=ES_BULK_CHUNK_SIZE, raise_on_error=False, refresh='wait_for'
+            )
+            if errors:
+                logging.error(f"Elasticsearch update errors: {errors}")
+                return f"updated with {len(errors)} errors"
+            
+            es.indices.put_mapping(index=ES_INDEX_ALIAS,
+                                   body={"_meta": {"catalogue_hash": self._elasticsearch_catalogue_hash()}})
+            return "updated"
         
-        # Get all image files
-        image_files = [f for f in os.listdir(image_dir) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+        except Exception as e:
+            logging.error(f"Error updating Elasticsearch: {e}")
+            return f"error: {e}"
+    
+    def _update_knowledge_base(self, upserts, removed, rematerialize=False):
+        """Write changed foods and their inferred triples to the Fuseki knowledge
+        base, or recompute the inferred triples of every food with rematerialize"""
+        try:
+            reasoner = populate_kb.load_reasoner(ONTOLOGY_FILE, self.ontology_classes)
+            if upserts or removed:
+                populate_kb.update_foods(upserts, removed, reasoner)
+            if rematerialize:
+                populate_kb.materialize_inferences(self.food_mappings.items(), reasoner)
+            return "updated"
+        except Exception as e:
+            logging.error(f"Error updating knowledge base: {e}")
+            return f"error: {e}"
+    
+    def get_food_mapping(self, food_name):
+        """Get mapping for a specific food"""
+        return self.food_mappings.get(food_name, {
+            'ontology_class': 'Food',
+            'food_type': 'Unknown',
+            'category': 'Unknown',
+            'region': 'Unknown'
+        })
+    
+    def get_food_image_info(self, food_name):
+        """Get comprehensive image information for a food"""
+        images = self.image_manifest.get(food_name)
         
-        if not image_files:
+        if not images:
             return {
                 'has_images': False,
                 'image_count': 0,
@@ -350,45 +2362,50 @@ class FoodSemanticService:
                 'thumbnail_url': None
             }
         
-        # Sort images for consistent ordering
-        image_files.sort()
-        
         # Create URLs for all images
         encoded_food_name = quote(food_name)
         image_urls = []
         
-        for i, image_file in enumerate(image_files):
+        for i, image in enumerate(images):
             image_url = f"/api/food/{encoded_food_name}/image/{i}"
             image_urls.append({
                 'url': image_url,
-                'filename': image_file,
+                'filename': image.filename,
                 'index': i
             })
         
         return {
             'has_images': True,
-            'image_count': len(image_files),
+            'image_count': len(images),
             'image_urls': image_urls,
             'thumbnail_url': f"/api/food/{encoded_food_name}/image/0",  # First image as thumbnail
             'primary_image': f"/api/food/{encoded_food_name}/image"     # Default endpoint
         }
     
     def _index_foods_in_elasticsearch(self):
-        """Index food items in Elasticsearch for full-text search with enhanced analyzers"""
+        """Index food items in Elasticsearch for full-text search with enhanced analyzers.
+        
+        Foods are bulk-loaded into a new versioned index, and the search alias
+        is switched over to it atomically once it is complete, so searches keep
+        hitting the previous index for the whole rebuild. Returns whether the
+        new index went live.
+        """
         if es is None:
             print("⚠️ Elasticsearch not available - skipping indexing")
-            return
-            
+            return False
+        
+        index_name = f"{ES_INDEX_ALIAS}_v{int(time.time() * 1000)}"
+        build_start = time.perf_counter()
+        
         try:
-            # Delete existing index to recreate with better settings
-            if es.indices.exists(index="foods"):
-                es.indices.delete(index="foods")
-            
-            # Create index with enhanced text analysis
+            # Create index with enhanced text analysis; refreshes are off while bulk loading
             es.indices.create(
-                index="foods",
+                index=index_name,
                 body={
                     "settings": {
+                        "index": {
+                            "refresh_interval": "-1"
+                        },
                         "analysis": {
                             "analyzer": {
                                 "food_analyzer": {
@@ -404,6 +2421,7 @@ class FoodSemanticService:
                         }
                     },
                     "mappings": {
+                        "_meta": {"catalogue_hash": self._elasticsearch_catalogue_hash()},
                         "properties": {
                             "name": {
                                 "type": "text", 
@@ -432,59 +2450,376 @@ class FoodSemanticService:
                     }
                 }
             )
-            print("✅ Created enhanced Elasticsearch index 'foods'")
+            print(f"✅ Created enhanced Elasticsearch index '{index_name}'")
             
             # Index all foods with comprehensive data including alternatives
-            indexed_count = 0
-            for food_name, properties in self.food_mappings.items():
-                image_info = self.get_food_image_info(food_name)
-                
-                # Generate search alternatives
-                alternatives = self.smart_search._generate_alternatives(food_name)
-                
-                doc = {
-                    "name": food_name,
-                    "name_alternatives": ' '.join(alternatives),
-                    "ontology_class": properties.get('ontology_class', 'Food'),
-                    "food_type": properties.get('food_type', 'Unknown'),
-                    "category": properties.get('category', 'Unknown'),
-                    "region": properties.get('region', 'Unknown'),
-                    "preparation": properties.get('preparation', 'Unknown'),
-                    "cultural_origin": properties.get('cultural_origin', 'Unknown'),
-                    "nutritional_focus": properties.get('nutritional_focus', 'Unknown'),
-                    "primary_ingredients": ' '.join(properties.get('primary_ingredients', [])),
-                    "has_images": image_info['has_images'],
-                    "image_count": image_info['image_count']
+            actions = (
+                {
+                    "_index": index_name,
+                    "_id": self._elasticsearch_doc_id(food_name),
+                    "_source": self._elasticsearch_document(food_name, properties)
                 }
-                
-                es.index(
-                    index="foods",
-                    id=food_name.replace(' ', '_').replace(',', '').replace('(', '').replace(')', ''),
-                    body=doc
-                )
-                indexed_count += 1
-            
-            print(f"✅ Indexed {indexed_count} foods in Elasticsearch with enhanced search")
+                for food_name, properties in self.food_mappings.items()
+            )
+            indexed_count, _ = helpers.bulk(es, actions, chunk_size=ES_BULK_CHUNK_SIZE)
+            
+            es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "1s"}})
+            es.indices.refresh(index=index_name)
+            
+            old_indices = self._switch_elasticsearch_alias(index_name)
                 
         except Exception as e:
             logging.error(f"Error indexing foods: {e}")
             print(f"❌ Error indexing foods: {e}")
+            
+            # Leave the alias on the previous index and drop the incomplete one
+            try:
+                es.indices.delete(index=index_name, ignore_unavailable=True)
+            except Exception:
+                pass
+            return False
+        
+        # The new index is live by now, so an old one that cannot be dropped is only left behind
+        for old_index in old_indices:
+            try:
+                es.indices.delete(index=old_index, ignore_unavailable=True)
+            except Exception as e:
+                logging.error(f"Error deleting old Elasticsearch index {old_index}: {e}")
+        
+        record_index_build('elasticsearch', time.perf_counter() - build_start)
+        print(f"✅ Indexed {indexed_count} foods in Elasticsearch with enhanced search")
+        return True
+    
+    def _switch_elasticsearch_alias(self, index_name):
+        """Atomically point the search alias at a new index; returns the indices it left"""
+        if es.indices.exists_alias(name=ES_INDEX_ALIAS):
+            old_indices = list(es.indices.get_alias(name=ES_INDEX_ALIAS).keys())
+        else:
+            old_indices = []
+            # A concrete index still carrying the alias name has to make way for it
+            if es.indices.exists(index=ES_INDEX_ALIAS):
+                es.indices.delete(index=ES_INDEX_ALIAS)
+        
+        actions = [{"remove": {"index": old_index, "alias": ES_INDEX_ALIAS}} for old_index in old_indices]
+        actions.append({"add": {"index": index_name, "alias": ES_INDEX_ALIAS}})
+        es.indices.update_aliases(body={"actions": actions})
+        return old_indices
+    
+    def _elasticsearch_doc_id(self, food_name):
+        """Document id of a food in Elasticsearch"""
+        return food_name.replace(' ', '_').replace(',', '').replace('(', '').replace(')', '')
+    
+    def _elasticsearch_document(self, food_name, properties):
+        """Elasticsearch document of a food, including its search alternatives"""
+        image_info = self.get_food_image_info(food_name)
+        
+        # Generate search alternatives
+        alternatives = self.smart_search._generate_alternatives(food_name)
+        
+        return {
+            "name": food_name,
+            "name_alternatives": ' '.join(alternatives),
+            "ontology_class": properties.get('ontology_class', 'Food'),
+            "food_type": properties.get('food_type', 'Unknown'),
+            "category": properties.get('category', 'Unknown'),
+            "region": properties.get('region', 'Unknown'),
+            "preparation": properties.get('preparation', 'Unknown'),
+            "cultural_origin": properties.get('cultural_origin', 'Unknown'),
+            "nutritional_focus": properties.get('nutritional_focus', 'Unknown'),
+            "primary_ingredients": ' '.join(properties.get('primary_ingredients', [])),
+            "has_images": image_info['has_images'],
+            "image_count": image_info['image_count']
+        }
 
 # Initialize service
 print("🚀 Initializing Food Semantic Service with Smart Search...")
-service = FoodSemanticService()
 
-# Fixed search endpoint with proper query handling
-@app.route('/api/search', methods=['GET'])
+SEARCH_FILTER_FIELDS = [
+    ("class", "ontology_class"),
+    ("region", "region"),
+    ("category", "category"),
+    ("preparation", "preparation"),
+    ("nutrition", "nutritional_focus")
+]
+
+def _elasticsearch_query(query_text, filters, include_fuzzy):
+    """Elasticsearch request body of a search"""
+    # Enhanced Elasticsearch query focused on relevant matches
+    search_body = {
+        "query": {
+            "bool": {
+                "should": [
+                    # Exact name matches get highest score
+                    {
+                        "match": {
+                            "name": {
+                                "query": query_text,
+                                "boost": 3.0,
+                                "fuzziness": "AUTO" if include_fuzzy else "0"
+                            }
+                        }
+                    },
+                    # Name alternatives (content in parentheses)
+                    {
+                        "match": {
+                            "name_alternatives": {
+                                "query": query_text,
+                                "boost": 2.0,
+                                "fuzziness": "AUTO" if include_fuzzy else "0"
+                            }
+                        }
+                    },
+                    # Ingredients get medium score
+                    {
+                        "match": {
+                            "primary_ingredients": {
+                                "query": query_text,
+                                "boost": 1.5,
+                                "fuzziness": "AUTO" if include_fuzzy else "0"
+                            }
+                        }
+                    },
+                    # Cultural origin gets lower score
+                    {
+                        "match": {
+                            "cultural_origin": {
+                                "query": query_text,
+                                "boost": 1.0
+                            }
+                        }
+                    }
+                ],
+                "filter": [],
+                "minimum_should_match": 1
+            }
+        },
+        "min_score": 0.5  # Only return results with reasonable relevance
+    }
+    
+    # Add filters, a class matching its subclasses too
+    for param, field in SEARCH_FILTER_FIELDS:
+        value = filters[param]
+        if value and param == 'class':
+            search_body["query"]["bool"]["filter"].append({
+                "terms": {field: sorted(service.class_hierarchy.subclasses(value))}
+            })
+        elif value:
+            search_body["query"]["bool"]["filter"].append({
+                "term": {field: value}
+            })
+    
+    return search_body
+
+def _with_base_url(data, base_url):
+    """Copy of a food record's data with full image URLs for web viewing"""
+    data = dict(data)
+    if data.get('has_images'):
+        if data.get('thumbnail_url'):
+            data['thumbnail_url'] = base_url + data['thumbnail_url']
+        if data.get('primary_image'):
+            data['primary_image'] = base_url + data['primary_image']
+        data['image_urls'] = [dict(img, url=base_url + img['url'], full_url=base_url + img['full_url'])
+                              for img in data['image_urls']]
+    return data
+
+def _food_record(food_name, keep=True):
+    """Response entry of a food - its mapping, name and image information with
+    relative URLs - and its JSON serialization, split where the base URL goes.
+    
+    Records are built once per catalogue generation and image listing, and
+    shared by every response; _with_base_url and _food_json make the copies
+    responses are built from. keep=False uses a cached record but does not
+    cache a new one.
+    """
+    key = (service.generation, service.image_manifest.version, food_name)
+    record = service.food_records.get(key)
+    if record is None:
+        with timed('image'):
+            data = service.food_mappings.get(food_name, {}).copy()
+            data['name'] = food_name
+            data.update(service.get_food_image_info(food_name))
+            for img in data['image_urls']:
+                img['full_url'] = img['url']  # Alias for clarity
+            
+            # Every URL is marked by a NUL, which JSON escapes; a food whose own data holds
+            # one is serialized per response instead
+            url_count = (bool(data.get('thumbnail_url')) + bool(data.get('primary_image'))
+                         + 2 * len(data['image_urls']) if data['has_images'] else 0)
+            json_parts = json.dumps(_with_base_url(data, '\x00'), sort_keys=True,
+                                    separators=(',', ':')).split('\\u0000')
+            record = FoodRecord(data, tuple(json_parts) if len(json_parts) == url_count + 1 else None)
+        if keep:
+            service.food_records.set(key, record)
+    return record
+
+def _food_json(record, base_url):
+    """JSON serialization of a food record with full image URLs"""
+    if record.json_parts is None:
+        return json.dumps(_with_base_url(record.data, base_url), sort_keys=True, separators=(',', ':'))
+    return base_url.join(record.json_parts)
+
+def _elasticsearch_results(hits, base_url):
+    """Response entries of Elasticsearch hits"""
+    search_results = []
+    with timed('enrichment'):
+        for hit in hits:
+            food_data = hit['_source']
+            
+            # Add detailed mapping information and image information with full URLs
+            food_data.update(_with_base_url(_food_record(food_data['name']).data, base_url))
+            
+            # Add search relevance score
+            food_data['search_score'] = hit['_score']
+            food_data['relevance'] = 'high' if hit['_score'] > 2.0 else 'medium' if hit['_score'] > 1.0 else 'low'
+            
+            search_results.append(food_data)
+    return search_results
+
+def _smart_search_results(query_text, filters, base_url):
+    """Response entries of a smart search"""
+    with timed('query'):
+        results = service.smart_search.smart_search(query_text)
+    
+    search_results = []
+    with timed('enrichment'):
+        for result in results:
+            food_name = result['food_name']
+            properties = service.get_food_mapping(food_name)
+            
+            # Apply filters
+            if filters['class'] and (properties.get('ontology_class')
+                                     not in service.class_hierarchy.subclasses(filters['class'])):
+                continue
+            if filters['region'] and properties.get('region') != filters['region']:
+                continue
+            if filters['category'] and properties.get('category') != filters['category']:
+                continue
+            
+            # Build response
+            food_data = _with_base_url(_food_record(food_name).data, base_url)
+            food_data['match_type'] = result['match_type']
+            food_data['search_score'] = result['total_score']
+            food_data['relevance'] = 'high' if result['total_score'] > 1.5 else 'medium' if result['total_score'] > 1.0 else 'low'
+            
+            search_results.append(food_data)
+    return search_results
+
+def _search_found(query_text, search_results, suggest_corrections, from_elasticsearch, degraded):
+    """Everything the response of a search is built from"""
+    suggestions = []
+    fallback_suggestions = []
+    
+    with timed('suggestions'):
+        # Generate suggestions if requested and few results found
+        if suggest_corrections and query_text and len(search_results) < 3:
+            suggestions = service.smart_search.suggest_corrections(query_text)
+        if not suggestions and not search_results:
+            fallback_suggestions = service.smart_search.suggest_corrections(query_text, 3)
+    
+    return {
+        "results": search_results,
+        "suggestions": suggestions,
+        "fallback_suggestions": fallback_suggestions,
+        "search_type": "elasticsearch" if from_elasticsearch else "smart_fallback",
+        # Fallback results stand in for Elasticsearch ones and are not cached
+        "degraded": degraded
+    }
+
+def _execute_search(query_text, filters, include_fuzzy, suggest_corrections, base_url):
+    """Run a search and collect everything its response is built from"""
+    use_elasticsearch = service.use_elasticsearch()
+    results = None
+    
+    # Use Elasticsearch once its index is ready and while it answers within its
+    # latency budget, otherwise use smart search
+    if not use_elasticsearch:
+        metrics.increment('food_service_elasticsearch_fallbacks_total', reason='not_ready')
+    elif not service.elasticsearch_breaker.allow():
+        metrics.increment('food_service_elasticsearch_fallbacks_total', reason='breaker_open')
+    else:
+        try:
+            with timed('query'):
+                results = es_search.search(index=ES_INDEX_ALIAS, body=_elasticsearch_query(query_text, filters, include_fuzzy),
+                                           size=20, request_timeout=ES_SEARCH_TIMEOUT)
+            service.elasticsearch_breaker.record_success()
+        except Exception as e:
+            service.elasticsearch_breaker.record_failure()
+            metrics.increment('food_service_elasticsearch_fallbacks_total', reason='error')
+            logging.error(f"Elasticsearch search failed, falling back to smart search: {e}")
+    
+    if results is not None:
+        search_results = _elasticsearch_results(results['hits']['hits'], base_url)
+    else:
+        # Use smart search fallback
+        search_results = _smart_search_results(query_text, filters, base_url)
+    
+    return _search_found(query_text, search_results, suggest_corrections,
+                         results is not None, use_elasticsearch and results is None)
+
+def _search_cache_key(query_text, filters, include_fuzzy, suggest_corrections, base_url):
+    """Cache key of a search; stale once the data or the image listing changes"""
+    return (
+        service.generation,
+        service.image_manifest.version,
+        base_url,
+        query_text.lower().strip(),
+        tuple(sorted(filters.items())),
+        include_fuzzy,
+        suggest_corrections
+    )
+
+def _search_response(query_text, filters, found):
+    """JSON body of a search"""
+    search_results = found["results"]
+    suggestions = found["suggestions"]
+    
+    # Prepare response
+    response = {
+        "results": search_results,
+        "query": {
+            "text": query_text,
+            "filters": filters
+        },
+        "total_results": len(search_results),
+        "search_type": found["search_type"]
+    }
+    if found["degraded"]:
+        response["degraded"] = True
+    
+    if suggestions:
+        response["suggestions"] = suggestions
+        response["message"] = f"Did you mean one of these? Found {len(search_results)} results for '{query_text}'"
+    elif len(search_results) == 0:
+        response["message"] = f"No results found for '{query_text}'. Try a different spelling or search term."
+        response["suggestions"] = found["fallback_suggestions"]
+    else:
+        response["message"] = f"Found {len(search_results)} results for '{query_text}'"
+    
+    return response
+
+def _empty_search_response(filters):
+    """JSON body of a search without query text"""
+    return {
+        "results": [],
+        "query": {
+            "text": "",
+            "filters": filters
+        },
+        "total_results": 0,
+        "message": "Please provide a search query using ?q=your_search_term",
+        "search_type": "no_query"
+    }
+
+@api.route('/api/search', methods=['GET'])
 def search_foods():
-    """Enhanced search with case-insensitive matching, typo correction, and suggestions"""
+    """Enhanced search with case-insensitive matching, typo correction, and suggestions.
+    
+    With Accept: application/x-ndjson the results are streamed one per line,
+    after a header line holding the rest of the response.
+    """
     # Support both 'q' and 'name' parameters for user convenience
     query_text = request.args.get('q', '') or request.args.get('name', '')
-    ontology_class = request.args.get('class', '')
-    region = request.args.get('region', '')
-    category = request.args.get('category', '')
-    preparation = request.args.get('preparation', '')
-    nutritional_focus = request.args.get('nutrition', '')
+    filters = {param: request.args.get(param, '') for param, _ in SEARCH_FILTER_FIELDS}
     
     # New parameters for enhanced search
     suggest_corrections = request.args.get('suggest', 'true').lower() == 'true'
@@ -494,345 +2829,374 @@ def search_foods():
     base_url = request.url_root.rstrip('/')
     
     try:
-        search_results = []
-        suggestions = []
-        
         # If no query text, return empty results (not all foods)
         if not query_text.strip():
-            return jsonify({
-                "results": [],
-                "query": {
-                    "text": "",
-                    "filters": {
-                        "class": ontology_class,
-                        "region": region,
-                        "category": category,
-                        "preparation": preparation,
-                        "nutrition": nutritional_focus
-                    }
-                },
-                "total_results": 0,
-                "message": "Please provide a search query using ?q=your_search_term",
-                "search_type": "no_query"
+            if _wants_ndjson():
+                body = _empty_search_response(filters)
+                del body["results"]
+                return _ndjson_response(body, ())
+            return jsonify(_empty_search_response(filters))
+        
+        # Responses only change on reload, so repeated searches are served from the cache
+        cache_key = _search_cache_key(query_text, filters, include_fuzzy, suggest_corrections, base_url)
+        found = service.search_cache.get(cache_key)
+        cache_status = "HIT" if found is not None else "MISS"
+        if found is None:
+            found = _execute_search(query_text, filters, include_fuzzy, suggest_corrections, base_url)
+            if not found["degraded"]:
+                service.search_cache.set(cache_key, found)
+        
+        with timed('serialization'):
+            body = _search_response(query_text, filters, found)
+            if _wants_ndjson():
+                # The header line holds everything but the results, which follow one per line
+                results = body.pop("results")
+                response = _ndjson_response(body, (json.dumps(result, sort_keys=True, separators=(',', ':'))
+                                                   for result in results))
+            else:
+                response = jsonify(body)
+        response.headers['X-Cache'] = cache_status
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e), "search_type": "error"}), 500
+
+def _batch_flag(value, default):
+    """A boolean option of a batch search, given as a JSON bool or a 'true'/'false' string"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+@api.route('/api/search/batch', methods=['POST'])
+def batch_search_foods():
+    """Run many searches in one request.
+    
+    The body is {"queries": [...], "fuzzy": ..., "suggest": ...}, where each
+    query is a string or an object with "q" and the /api/search filters and
+    flags. Cache misses are sent to Elasticsearch in a single msearch call.
+    """
+    body = request.get_json(silent=True) or {}
+    queries = body.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Provide a non-empty 'queries' list"}), 400
+    if len(queries) > BATCH_SEARCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {BATCH_SEARCH_MAX_QUERIES} queries per batch"}), 400
+    
+    base_url = request.url_root.rstrip('/')
+    default_fuzzy = _batch_flag(body.get('fuzzy'), True)
+    default_suggest = _batch_flag(body.get('suggest'), True)
+    
+    try:
+        searches = []
+        for query in queries:
+            if isinstance(query, str):
+                query = {"q": query}
+            elif not isinstance(query, dict):
+                return jsonify({"error": "Each query must be a string or an object"}), 400
+            searches.append({
+                "text": str(query.get('q') or query.get('name') or ''),
+                "filters": {param: str(query.get(param) or '') for param, _ in SEARCH_FILTER_FIELDS},
+                "fuzzy": _batch_flag(query.get('fuzzy'), default_fuzzy),
+                "suggest": _batch_flag(query.get('suggest'), default_suggest)
             })
         
-        # Use Elasticsearch if available, otherwise use smart search
-        if es is not None:
-            # Enhanced Elasticsearch query focused on relevant matches
-            search_body = {
-                "query": {
-                    "bool": {
-                        "should": [
-                            # Exact name matches get highest score
-                            {
-                                "match": {
-                                    "name": {
-                                        "query": query_text,
-                                        "boost": 3.0,
-                                        "fuzziness": "AUTO" if include_fuzzy else "0"
-                                    }
-                                }
-                            },
-                            # Name alternatives (content in parentheses)
-                            {
-                                "match": {
-                                    "name_alternatives": {
-                                        "query": query_text,
-                                        "boost": 2.0,
-                                        "fuzziness": "AUTO" if include_fuzzy else "0"
-                                    }
-                                }
-                            },
-                            # Ingredients get medium score
-                            {
-                                "match": {
-                                    "primary_ingredients": {
-                                        "query": query_text,
-                                        "boost": 1.5,
-                                        "fuzziness": "AUTO" if include_fuzzy else "0"
-                                    }
-                                }
-                            },
-                            # Cultural origin gets lower score
-                            {
-                                "match": {
-                                    "cultural_origin": {
-                                        "query": query_text,
-                                        "boost": 1.0
-                                    }
-                                }
-                            }
-                        ],
-                        "filter": [],
-                        "minimum_should_match": 1
-                    }
-                },
-                "min_score": 0.5  # Only return results with reasonable relevance
-            }
-            
-            # Add filters
-            filters = [
-                (ontology_class, "ontology_class"),
-                (region, "region"),
-                (category, "category"),
-                (preparation, "preparation"),
-                (nutritional_focus, "nutritional_focus")
+        # Serve what we can from the cache, and search for the rest together
+        found = [None] * len(searches)
+        misses = []
+        for position, search in enumerate(searches):
+            if not search["text"].strip():
+                continue
+            search["cache_key"] = _search_cache_key(search["text"], search["filters"], search["fuzzy"],
+                                                    search["suggest"], base_url)
+            found[position] = service.search_cache.get(search["cache_key"])
+            if found[position] is None:
+                misses.append(position)
+        
+        use_elasticsearch = service.use_elasticsearch()
+        hits = {}
+        if misses and not use_elasticsearch:
+            metrics.increment('food_service_elasticsearch_fallbacks_total', len(misses), reason='not_ready')
+        elif misses and not service.elasticsearch_breaker.allow():
+            metrics.increment('food_service_elasticsearch_fallbacks_total', len(misses), reason='breaker_open')
+        elif misses:
+            msearch_body = []
+            for position in misses:
+                search = searches[position]
+                msearch_body.append({"index": ES_INDEX_ALIAS})
+                msearch_body.append(dict(_elasticsearch_query(search["text"], search["filters"], search["fuzzy"]),
+                                         size=20))
+            try:
+                with timed('query'):
+                    responses = es_search.msearch(body=msearch_body, request_timeout=BATCH_SEARCH_TIMEOUT)['responses']
+                service.elasticsearch_breaker.record_success()
+                hits = {position: item['hits']['hits']
+                        for position, item in zip(misses, responses) if 'error' not in item}
+            except Exception as e:
+                service.elasticsearch_breaker.record_failure()
+                logging.error(f"Elasticsearch batch search failed, falling back to smart search: {e}")
+            if len(hits) < len(misses):
+                metrics.increment('food_service_elasticsearch_fallbacks_total', len(misses) - len(hits), reason='error')
+        
+        for position in misses:
+            search = searches[position]
+            if position in hits:
+                search_results = _elasticsearch_results(hits[position], base_url)
+            else:
+                search_results = _smart_search_results(search["text"], search["filters"], base_url)
+            found[position] = _search_found(search["text"], search_results, search["suggest"],
+                                            position in hits, use_elasticsearch and position not in hits)
+            if not found[position]["degraded"]:
+                service.search_cache.set(search["cache_key"], found[position])
+        
+        with timed('serialization'):
+            responses = [
+                _search_response(search["text"], search["filters"], found[position]) if found[position] is not None
+                else _empty_search_response(search["filters"])
+                for position, search in enumerate(searches)
             ]
-            
-            for value, field in filters:
-                if value:
-                    search_body["query"]["bool"]["filter"].append({
-                        "term": {field: value}
-                    })
-            
-            results = es.search(index="foods", body=search_body, size=20)
-            
-            for hit in results['hits']['hits']:
-                food_data = hit['_source']
-                food_name = food_data['name']
-                
-                # Add detailed mapping information
-                if food_name in service.food_mappings:
-                    food_data.update(service.food_mappings[food_name])
-                
-                # Add comprehensive image information with full URLs
-                image_info = service.get_food_image_info(food_name)
-                
-                # Convert relative URLs to full URLs for web viewing
-                if image_info['has_images']:
-                    # Update thumbnail URL to full URL
-                    if image_info['thumbnail_url']:
-                        image_info['thumbnail_url'] = base_url + image_info['thumbnail_url']
-                    
-                    # Update primary image URL to full URL
-                    if image_info.get('primary_image'):
-                        image_info['primary_image'] = base_url + image_info['primary_image']
-                    
-                    # Update all image URLs to full URLs
-                    for img in image_info['image_urls']:
-                        img['url'] = base_url + img['url']
-                        img['full_url'] = img['url']  # Alias for clarity
-                
-                food_data.update(image_info)
-                
-                # Add search relevance score
-                food_data['search_score'] = hit['_score']
-                food_data['relevance'] = 'high' if hit['_score'] > 2.0 else 'medium' if hit['_score'] > 1.0 else 'low'
-                
-                search_results.append(food_data)
-        
-        else:
-            # Use smart search fallback
-            smart_results = service.smart_search.smart_search(query_text)
-            
-            for result in smart_results:
-                food_name = result['food_name']
-                properties = service.get_food_mapping(food_name)
-                
-                # Apply filters
-                if ontology_class and properties.get('ontology_class') != ontology_class:
-                    continue
-                if region and properties.get('region') != region:
-                    continue
-                if category and properties.get('category') != category:
-                    continue
-                
-                # Build response
-                food_data = properties.copy()
-                food_data['name'] = food_name
-                food_data['match_type'] = result['match_type']
-                food_data['search_score'] = result['total_score']
-                food_data['relevance'] = 'high' if result['total_score'] > 1.5 else 'medium' if result['total_score'] > 1.0 else 'low'
-                
-                # Add image information with full URLs
-                image_info = service.get_food_image_info(food_name)
-                
-                # Convert relative URLs to full URLs for web viewing
-                if image_info['has_images']:
-                    # Update thumbnail URL to full URL
-                    if image_info['thumbnail_url']:
-                        image_info['thumbnail_url'] = base_url + image_info['thumbnail_url']
-                    
-                    # Update primary image URL to full URL
-                    if image_info.get('primary_image'):
-                        image_info['primary_image'] = base_url + image_info['primary_image']
-                    
-                    # Update all image URLs to full URLs
-                    for img in image_info['image_urls']:
-                        img['url'] = base_url + img['url']
-                        img['full_url'] = img['url']  # Alias for clarity
-                
-                food_data.update(image_info)
-                
-                search_results.append(food_data)
-        
-        # Generate suggestions if requested and few results found
-        if suggest_corrections and query_text and len(search_results) < 3:
-            suggestions = service.smart_search.suggest_corrections(query_text)
-        
-        # Prepare response
-        response = {
-            "results": search_results,
-            "query": {
-                "text": query_text,
-                "filters": {
-                    "class": ontology_class,
-                    "region": region,
-                    "category": category,
-                    "preparation": preparation,
-                    "nutrition": nutritional_focus
-                }
-            },
-            "total_results": len(search_results),
-            "search_type": "elasticsearch" if es is not None else "smart_fallback"
-        }
-        
-        if suggestions:
-            response["suggestions"] = suggestions
-            response["message"] = f"Did you mean one of these? Found {len(search_results)} results for '{query_text}'"
-        elif len(search_results) == 0:
-            response["message"] = f"No results found for '{query_text}'. Try a different spelling or search term."
-            response["suggestions"] = service.smart_search.suggest_corrections(query_text, 3)
-        else:
-            response["message"] = f"Found {len(search_results)} results for '{query_text}'"
-        
-        return jsonify(response)
+            return jsonify({
+                "responses": responses,
+                "total_queries": len(responses),
+                "cache_hits": len(searches) - len(misses) - sum(1 for item in found if item is None)
+            })
     
     except Exception as e:
         return jsonify({"error": str(e), "search_type": "error"}), 500
 
+def _wants_ndjson():
+    """Whether the client asked for newline-delimited JSON over plain JSON"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def _ndjson_response(header, lines):
+    """Streamed NDJSON response: the header object on the first line, then
+    one line per already serialized entry, produced as the client reads"""
+    def generate():
+        yield json.dumps(header, sort_keys=True, separators=(',', ':')) + '\n'
+        try:
+            for line in lines:
+                yield line + '\n'
+        except Exception as e:
+            # The status is already sent, so the stream just ends early
+            logging.error(f"Error while streaming a response: {e}")
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+def _json_with_results(results, payload):
+    """JSON response of payload with a "results" list made of already
+    serialized entries"""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return Response('{"results":[' + ','.join(results) + '],' + body[1:] + '\n', mimetype='application/json')
+
+def _stream_food_records(facets, matches, start, base_url):
+    """Serialized records of the foods in a bitset from id start on, a page at a time.
+    
+    Records built for the stream are not cached, so a full listing does not
+    evict the ones pages and searches use.
+    """
+    while start is not None:
+        names, start = facets.page(matches, start, FOODS_MAX_PAGE_SIZE)
+        for food_name in names:
+            yield _food_json(_food_record(food_name, keep=False), base_url)
+
 # Add a new endpoint for getting all foods (when no query is provided)
-@app.route('/api/foods/all', methods=['GET'])
+@api.route('/api/foods/all', methods=['GET'])
 def get_all_foods():
-    """Get all foods with image information - separate from search"""
+    """Get a page of foods with image information, filtered by facets - separate from search.
+    
+    With Accept: application/x-ndjson, every matching food from the cursor
+    on is streamed instead, one per line after a header line with the
+    totals and facet counts, and limit is ignored.
+    """
     try:
         # Get the base URL for full image URLs
         base_url = request.url_root.rstrip('/')
         
-        # Apply filters if provided
-        ontology_class = request.args.get('class', '')
-        region = request.args.get('region', '')
-        category = request.args.get('category', '')
-        
-        foods = []
-        for food_name, properties in service.food_mappings.items():
-            # Apply filters
-            if ontology_class and properties.get('ontology_class') != ontology_class:
-                continue
-            if region and properties.get('region') != region:
-                continue
-            if category and properties.get('category') != category:
-                continue
-            
-            food_data = properties.copy()
-            food_data['name'] = food_name
-            
-            # Add image information with full URLs
-            image_info = service.get_food_image_info(food_name)
-            
-            # Convert relative URLs to full URLs for web viewing
-            if image_info['has_images']:
-                # Update thumbnail URL to full URL
-                if image_info['thumbnail_url']:
-                    image_info['thumbnail_url'] = base_url + image_info['thumbnail_url']
-                
-                # Update primary image URL to full URL
-                if image_info.get('primary_image'):
-                    image_info['primary_image'] = base_url + image_info['primary_image']
-                
-                # Update all image URLs to full URLs
-                for img in image_info['image_urls']:
-                    img['url'] = base_url + img['url']
-                    img['full_url'] = img['url']  # Alias for clarity
-            
-            food_data.update(image_info)
-            foods.append(food_data)
+        # Apply filters if provided (?class= is the ontology_class facet)
+        filters = {}
+        for field in FACET_FIELDS:
+            value = request.args.get('class' if field == 'ontology_class' else field, '')
+            if value:
+                filters[field] = value
         
-        return jsonify({
-            "results": foods,
-            "total_results": len(foods),
-            "message": f"Retrieved all {len(foods)} foods"
-        })
+        try:
+            limit = int(request.args.get('limit', FOODS_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        limit = max(1, min(limit, FOODS_MAX_PAGE_SIZE))
+        
+        # The cursor is the name of the next food, so it stays valid across reloads
+        facets = service.facets
+        cursor = request.args.get('cursor', '')
+        try:
+            start = facets.position(base64.urlsafe_b64decode(cursor).decode('utf-8')) if cursor else 0
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+        
+        if _wants_ndjson():
+            with timed('query'):
+                matches = facets.match(filters)
+                total = popcount(matches)
+                facet_counts = facets.counts(matches)
+            return _ndjson_response({
+                "total_results": total,
+                "filters": filters,
+                "facets": facet_counts,
+                "message": f"Streaming {total} foods"
+            }, _stream_food_records(facets, matches, start, base_url))
+        
+        with timed('query'):
+            matches = facets.match(filters)
+            names, next_id = facets.page(matches, start, limit)
+            total = popcount(matches)
+            facet_counts = facets.counts(matches)
+        next_cursor = None
+        if next_id is not None:
+            next_cursor = base64.urlsafe_b64encode(facets.names[next_id].encode('utf-8')).decode('ascii')
+        
+        # Entries are stitched together from the pre-serialized food records
+        with timed('enrichment'):
+            foods = [_food_json(_food_record(food_name), base_url) for food_name in names]
+        
+        with timed('serialization'):
+            return _json_with_results(foods, {
+                "total_results": total,
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "filters": filters,
+                "facets": facet_counts,
+                "message": f"Retrieved {len(foods)} of {total} foods"
+            })
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _parse_image_variant_args():
+    """Read the optional ?w=, ?h= and ?format= variant parameters, with the
+    dimensions snapped up to the next of IMAGE_VARIANT_SIZES"""
+    dimensions = []
+    for param in ('w', 'h'):
+        value = request.args.get(param)
+        if value is None:
+            dimensions.append(None)
+            continue
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"'{param}' must be a positive integer")
+        # Only a few sizes are generated, so the variants of an image stay few
+        dimensions.append(next((size for size in IMAGE_VARIANT_SIZES if size >= int(value)),
+                               IMAGE_VARIANT_SIZES[-1]))
+    
+    image_format = request.args.get('format')
+    if image_format is not None:
+        image_format = image_format.lower().replace('jpg', 'jpeg')
+        if image_format not in IMAGE_VARIANT_FORMATS:
+            raise ValueError(f"'format' must be one of: {', '.join(IMAGE_VARIANT_FORMATS)}")
+    
+    return dimensions[0], dimensions[1], image_format
+
+def _send_food_image(food_name, image):
+    """Send an image, or the requested resized variant of it, with CORS headers.
+    
+    Revalidations are answered with a 304 from the size and mtime of the
+    file, and range requests are served as partial content.
+    """
+    try:
+        width, height, image_format = _parse_image_variant_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    image = service.image_manifest.verify(food_name, image)
+    if image is None:
+        return jsonify({"error": "No image found"}), 404
+    
+    is_variant = bool(width or height or image_format)
+    etag = f"{image.size:x}-{int(image.mtime * 1000000):x}"
+    if is_variant:
+        etag += f"-{width or ''}x{height or ''}-{image_format or ''}"
+    last_modified = datetime.fromtimestamp(image.mtime, tz=timezone.utc)
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    elif is_variant:
+        variant_path, mimetype = service.image_variants.get(image, width, height, image_format)
+        try:
+            response = send_file(variant_path, mimetype=mimetype, etag=etag, last_modified=last_modified)
+        except FileNotFoundError:
+            # Evicted by another worker since get() looked at it
+            service.image_variants.forget(variant_path)
+            variant_path, mimetype = service.image_variants.get(image, width, height, image_format)
+            response = send_file(variant_path, mimetype=mimetype, etag=etag, last_modified=last_modified)
+    else:
+        response = send_file(image.path, etag=etag, last_modified=last_modified)
+    
+    # Send file with CORS headers for web viewing
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
 # Add CORS headers for image endpoints to work in browsers
-@app.route('/api/food/<food_name>/image', methods=['GET'])
+@api.route('/api/food/<food_name>/image', methods=['GET'])
 def get_food_image(food_name):
     """Get the first/primary image for a specific food with CORS headers"""
     try:
         # Decode URL-encoded food name
         food_name = food_name.replace('%20', ' ').replace('%2C', ',')
         
-        image_dir = os.path.join(IMAGES_PATH, food_name)
+        images = service.image_manifest.get(food_name)
         
-        if not os.path.exists(image_dir):
+        if images is None:
             return jsonify({"error": "Food not found"}), 404
         
-        # Get first image file in the directory
-        image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
-        
-        if not image_files:
+        if not images:
             return jsonify({"error": "No image found"}), 404
         
-        # Sort to ensure consistent ordering
-        image_files.sort()
-        image_path = os.path.join(image_dir, image_files[0])
-        
-        # Send file with CORS headers for web viewing
-        response = send_file(image_path)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
-        return response
+        return _send_food_image(food_name, images[0])
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/food/<food_name>/image/<int:image_index>', methods=['GET'])
+@api.route('/api/food/<food_name>/image/<int:image_index>', methods=['GET'])
 def get_food_image_by_index(food_name, image_index):
     """Get a specific image by index for a food with CORS headers"""
     try:
         # Decode URL-encoded food name
         food_name = food_name.replace('%20', ' ').replace('%2C', ',')
         
-        image_dir = os.path.join(IMAGES_PATH, food_name)
+        images = service.image_manifest.get(food_name)
         
-        if not os.path.exists(image_dir):
+        if images is None:
             return jsonify({"error": "Food not found"}), 404
         
-        # Get all image files
-        image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
-        
-        if not image_files:
+        if not images:
             return jsonify({"error": "No images found"}), 404
         
-        # Sort to ensure consistent ordering
-        image_files.sort()
-        
         # Check if index is valid
-        if image_index < 0 or image_index >= len(image_files):
-            return jsonify({"error": f"Image index {image_index} out of range. Available: 0-{len(image_files)-1}"}), 404
-        
-        image_path = os.path.join(image_dir, image_files[image_index])
+        if image_index < 0 or image_index >= len(images):
+            return jsonify({"error": f"Image index {image_index} out of range. Available: 0-{len(images)-1}"}), 404
         
-        # Send file with CORS headers for web viewing
-        response = send_file(image_path)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
-        return response
+        return _send_food_image(food_name, images[image_index])
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/search/suggest', methods=['GET'])
+@api.route('/api/search/suggest', methods=['GET'])
 def search_suggestions():
     """Get search suggestions for a query"""
     query = request.args.get('q', '')
-    max_suggestions = int(request.args.get('limit', '10'))
+    try:
+        max_suggestions = int(request.args.get('limit', '10'))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if max_suggestions < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+    max_suggestions = min(max_suggestions, SUGGEST_MAX_LIMIT)
     
     try:
-        suggestions = service.smart_search.suggest_corrections(query, max_suggestions)
+        with timed('suggestions'):
+            suggestions = service.smart_search.suggest_corrections(query, max_suggestions)
         
         return jsonify({
             "query": query,
@@ -843,20 +3207,139 @@ def search_suggestions():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@api.route('/api/semantic/foods', methods=['GET'])
+def semantic_foods():
+    """Foods from the knowledge base by ontology class, region and/or ingredient"""
+    filters = {
+        'class': request.args.get('class', ''),
+        'region': request.args.get('region', ''),
+        'ingredient': request.args.get('ingredient', '')
+    }
+    
+    if not any(filters.values()):
+        return jsonify({"error": "Provide at least one of ?class=, ?region= or ?ingredient="}), 400
+    
+    try:
+        limit = int(request.args.get('limit', '100'))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+    limit = min(limit, SPARQL_MAX_LIMIT)
+    
+    try:
+        # Fuseki holds asserted types only, so the class is expanded to its subclasses here
+        query_filters = dict(filters)
+        if filters['class']:
+            query_filters['class'] = tuple(sorted(service.class_hierarchy.subclasses(filters['class'])))
+        rows = sparql.find_foods(limit=limit, **query_filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except requests.RequestException as e:
+        return jsonify({"error": f"Knowledge base unavailable: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    results = []
+    for row in rows:
+        food_data = service.food_mappings.get(row['name'], {}).copy()
+        food_data.update(row)
+        results.append(food_data)
+    
+    return jsonify({
+        "results": results,
+        "filters": filters,
+        "total_results": len(results),
+        "source": "fuseki"
+    })
+
+@api.route('/api/admin/cache', methods=['GET'])
+def cache_stats():
+    """Hit/miss statistics of the response, food record and SPARQL caches"""
+    return jsonify({
+        "generation": service.generation,
+        "search": service.search_cache.stats(),
+        "food_records": service.food_records.stats(),
+        "sparql": sparql.cache.stats()
+    })
+
+def _admin_token():
+    """Admin token of a request, from X-Admin-Token or an Authorization bearer token"""
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+    return request.headers.get('X-Admin-Token', '')
+
+@api.route('/api/admin/reload', methods=['POST'])
+def reload_mappings():
+    """Reload food_mappings.json and reindex only the foods that changed.
+    
+    Requires the FOOD_SERVICE_ADMIN_TOKEN token. A worker that does not
+    publish to Elasticsearch and Fuseki forwards the reload to the one that
+    does and answers 202; every worker reloads once it is published.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled; set FOOD_SERVICE_ADMIN_TOKEN"}), 403
+    if not hmac.compare_digest(_admin_token().encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({"error": "Invalid or missing admin token"}), 401
+    
+    try:
+        summary = service.request_reload()
+        if summary is None:
+            return jsonify({"status": "forwarded to the publishing worker"}), 202
+        return jsonify(summary)
+    
+    except Exception as e:
+        return jsonify({"error": f"Failed to reload mappings: {str(e)}"}), 500
+
 # Include all other endpoints from the previous version...
 # (get_foods, get_food_image, get_food_semantic_info, etc.)
 
 
-@app.route('/health', methods=['GET'])
+def _check_dependency(check):
+    """Run a health check, timing it"""
+    start = time.perf_counter()
+    try:
+        healthy = bool(check())
+    except Exception:
+        healthy = False
+    return {
+        "status": "healthy" if healthy else "unhealthy",
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+@api.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint with search capabilities info"""
+    """Health check endpoint with search capabilities info.
+    
+    Fuseki and Elasticsearch are actually queried. Searches keep working
+    without them, so their failure makes the service degraded; it is only
+    unhealthy (503) when no food mappings are loaded.
+    """
+    fuseki = _check_dependency(lambda: sparql.ping(timeout=HEALTH_CHECK_TIMEOUT))
+    elasticsearch = _check_dependency(lambda: es_search is not None and
+                                      es_search.ping(request_timeout=HEALTH_CHECK_TIMEOUT))
+    elasticsearch["state"] = ("degraded" if service.use_elasticsearch() and
+                              service.elasticsearch_breaker.state != CircuitBreaker.CLOSED else
+                              "ready" if service.use_elasticsearch() else
+                              "indexing" if es is not None else "connecting")
+    elasticsearch["breaker"] = service.elasticsearch_breaker.stats()
+    
+    if not service.food_mappings:
+        status = "unhealthy"
+    elif fuseki["status"] != "healthy" or elasticsearch["status"] != "healthy" or elasticsearch["state"] != "ready":
+        status = "degraded"
+    else:
+        status = "healthy"
+    
     health_status = {
-        "status": "healthy",
+        "status": status,
         "services": {
-            "fuseki": "healthy",
+            "fuseki": fuseki,
             "web": "healthy",
-            "elasticsearch": "healthy" if es is not None else "unavailable",
-            "smart_search": "available"
+            "elasticsearch": elasticsearch,
+            "smart_search": "available" if service.food_mappings else "empty",
+            "images": "available" if os.path.isdir(IMAGES_PATH) else "missing"
         },
         "search_features": {
             "case_insensitive": True,
@@ -865,81 +3348,216 @@ def health_check():
             "typo_correction": True,
             "multi_language_terms": True
         },
-        "timestamp": "2025-05-30",
+        "ready": service.use_elasticsearch(),
+        "search_backend": "elasticsearch" if service.use_elasticsearch() else "smart_fallback",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "total_foods": len(service.food_mappings)
     }
-    return jsonify(health_status)
+    return jsonify(health_status), 503 if status == "unhealthy" else 200
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latencies, stage timings, cache hit rates, Elasticsearch fallbacks
+    and index build durations in the Prometheus text format"""
+    for cache_name, cache in (("search", service.search_cache), ("food_records", service.food_records),
+                              ("sparql", sparql.cache)):
+        stats = cache.stats()
+        metrics.set('food_service_cache_hits_total', stats["hits"], cache=cache_name)
+        metrics.set('food_service_cache_misses_total', stats["misses"], cache=cache_name)
+        metrics.set('food_service_cache_hit_ratio', stats["hit_rate"], cache=cache_name)
+        metrics.set('food_service_cache_entries', stats["size"], cache=cache_name)
+    metrics.set('food_service_elasticsearch_ready', int(service.use_elasticsearch()))
+    metrics.set('food_service_elasticsearch_breaker_open',
+                int(service.elasticsearch_breaker.state != CircuitBreaker.CLOSED))
+    metrics.set('food_service_foods', len(service.food_mappings))
+    metrics.set('food_service_generation', service.generation)
+    
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@api.before_app_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.timings = {}
+
+@api.after_app_request
+def _record_request_timings(response):
+    """Report the request's stage timings in a Server-Timing header and
+    record its latency"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    
+    timings = [f"{stage};dur={duration * 1000:.2f}" for stage, duration in g.get('timings', {}).items()]
+    timings.append(f"total;dur={elapsed * 1000:.2f}")
+    response.headers['Server-Timing'] = ', '.join(timings)
+    
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('food_service_request_duration_seconds', elapsed,
+                    endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+def _ontology_triples(ontology_classes, food_mappings):
+    """Triples of the ontology export: the classes, then every food with its properties"""
+    ns = Namespace(ONTOLOGY_NS)
+    
+    # Add ontology classes
+    for class_name, class_info in ontology_classes.items():
+        class_uri = ns[class_name]
+        yield (class_uri, RDF.type, RDFS.Class)
+        yield (class_uri, RDFS.label, Literal(class_info.get('label', class_name)))
+        if 'comment' in class_info:
+            yield (class_uri, RDFS.comment, Literal(class_info['comment']))
+    
+    # Add food items and their properties
+    for food_name, properties in food_mappings.items():
+        food_uri = ns[food_name.replace(' ', '_')]
+        yield (food_uri, RDF.type, ns[properties.get('ontology_class', 'Food')])
+        yield (food_uri, RDFS.label, Literal(food_name))
+        
+        for prop, value in properties.items():
+            if prop == 'ontology_class':
+                continue  # Already handled
+            for item in (value if isinstance(value, list) else [value]):
+                yield (food_uri, ns[prop], Literal(item))
+
+def _ontology_graph(triples):
+    """In-memory graph of the export, for the formats that need one"""
+    graph = Graph()
+    graph.bind("food", Namespace(ONTOLOGY_NS))
+    graph.bind("rdf", RDF)
+    graph.bind("rdfs", RDFS)
+    for triple in triples:
+        graph.add(triple)
+    return graph
 
-@app.route('/api/ontology/export', methods=['GET'])
+def _ntriples_chunks(triples):
+    """N-Triples of a stream of triples, in chunks of about ONTOLOGY_EXPORT_CHUNK_SIZE bytes"""
+    lines = []
+    size = 0
+    for triple in triples:
+        line = populate_kb.ntriples_line(triple).encode('utf-8')
+        lines.append(line)
+        size += len(line)
+        if size >= ONTOLOGY_EXPORT_CHUNK_SIZE:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b''.join(lines)
+
+def _export_version():
+    """Version of the exported data: the content of the mappings file it came from"""
+    key = f"{ONTOLOGY_EXPORT_VERSION}|{service.mappings_hash}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def _export_format():
+    """Export format from ?format=, or else the best match for the Accept header"""
+    export_format = request.args.get('format')
+    if export_format is not None:
+        if export_format not in ONTOLOGY_EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(ONTOLOGY_EXPORT_FORMATS)}")
+        return export_format
+    
+    by_mimetype = {mimetype: name for name, (_, mimetype, _) in ONTOLOGY_EXPORT_FORMATS.items()}
+    best = request.accept_mimetypes.best_match(list(by_mimetype))
+    return by_mimetype.get(best, next(iter(ONTOLOGY_EXPORT_FORMATS)))
+
+@api.route('/api/ontology/export', methods=['GET'])
 def export_ontology():
-    """Export the complete ontology with all data in RDF/XML format"""
+    """Export the complete ontology with all data.
+    
+    The format is picked with ?format= (rdf, nt, ttl or jsonld) or the
+    Accept header, RDF/XML by default. Exports are cached on disk per
+    format and data version, and revalidated with their ETag. N-Triples
+    are streamed straight from the mappings, without an in-memory graph,
+    and cached as they are sent.
+    """
     try:
-        # Create a new RDF graph
-        g = Graph()
-        
-        # Define namespaces
-        ns = Namespace(ONTOLOGY_NS)
-        g.bind("food", ns)
-        g.bind("rdf", RDF)
-        g.bind("rdfs", RDFS)
-        
-        # Add ontology classes
-        for class_name, class_info in service.ontology_classes.items():
-            class_uri = ns[class_name]
-            g.add((class_uri, RDF.type, RDFS.Class))
-            g.add((class_uri, RDFS.label, Literal(class_info.get('label', class_name))))
-            if 'comment' in class_info:
-                g.add((class_uri, RDFS.comment, Literal(class_info['comment'])))
-        
-        # Add food items and their properties
-        for food_name, properties in service.food_mappings.items():
-            # Create URI for the food item
-            food_uri = ns[food_name.replace(' ', '_')]
-            
-            # Add type
-            food_class = properties.get('ontology_class', 'Food')
-            g.add((food_uri, RDF.type, ns[food_class]))
-            
-            # Add label
-            g.add((food_uri, RDFS.label, Literal(food_name)))
-            
-            # Add properties
-            for prop, value in properties.items():
-                if prop == 'ontology_class':
-                    continue  # Already handled
-                    
-                if isinstance(value, list):
-                    for item in value:
-                        g.add((food_uri, ns[prop], Literal(item)))
-                else:
-                    g.add((food_uri, ns[prop], Literal(value)))
-        
-        # Serialize to RDF/XML
-        rdf_data = g.serialize(format='xml')
-        
-        # Create response
-        response = app.response_class(
-            response=rdf_data,
-            status=200,
-            mimetype='application/rdf+xml'
-        )
+        export_format = _export_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        rdflib_format, mimetype, extension = ONTOLOGY_EXPORT_FORMATS[export_format]
+        download_name = f"food_ontology_export{extension}"
+        
+        # A reload during these reads would mix data of two versions, so it is not cached
+        version = _export_version()
+        ontology_classes, food_mappings = service.ontology_classes, service.food_mappings
+        loaded_at = service.mappings_loaded_at
+        cacheable = _export_version() == version
+        etag = f"{version}-{export_format}"
+        
+        if not is_resource_modified(request.environ, etag=etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        export_path = service.ontology_exports.path(version, export_format)
+        if cacheable and os.path.exists(export_path):
+            try:
+                return send_file(export_path, mimetype=mimetype, etag=etag,
+                                 as_attachment=True, download_name=download_name)
+            except FileNotFoundError:
+                pass  # dropped by a worker on newer data; export it again
+        
+        triples = _ontology_triples(ontology_classes, food_mappings)
+        if rdflib_format == 'nt':
+            chunks = _ntriples_chunks(triples)
+            if cacheable:
+                chunks = service.ontology_exports.write_through(export_path, chunks, loaded_at)
+            response = Response(chunks, mimetype=mimetype)
+        else:
+            with timed('serialization'):
+                rdf_data = _ontology_graph(triples).serialize(format=rdflib_format, encoding='utf-8')
+            if cacheable and service.ontology_exports.store(export_path, rdf_data, loaded_at):
+                return send_file(export_path, mimetype=mimetype, etag=etag,
+                                 as_attachment=True, download_name=download_name)
+            response = Response(rdf_data, mimetype=mimetype)
         
         # Add headers for file download
-        response.headers['Content-Disposition'] = 'attachment; filename=food_ontology_export.rdf'
+        response.set_etag(etag)
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
         return response
         
     except Exception as e:
         return jsonify({"error": f"Failed to export ontology: {str(e)}"}), 500
 
+def create_app(start_pollers=True):
+    """Build the service and its in-memory indexes and create the Flask app.
+    
+    Elasticsearch is connected to and indexed in the background by
+    start_pollers(), so the app can serve from the smart search engine
+    right away. Under gunicorn this runs once in the master (preload_app)
+    so that workers share the built indexes, and start_pollers is left to
+    after_fork().
+    """
+    global service
+    service = FoodSemanticService()
+    if start_pollers:
+        service.start_pollers()
+    
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    return app
+
+def after_fork():
+    """Give a forked server process its own connections and background threads"""
+    global sparql
+    sparql = SparqlClient(FUSEKI_ENDPOINT)
+    service.start_pollers()
+
 if __name__ == '__main__':
+    app = create_app()
     print("🎯 Food Semantic Web Service with Smart Search starting...")
     print(f"📊 Loaded {len(service.food_mappings)} food mappings")
-    print(f"🔍 Elasticsearch: {'Connected' if es else 'Not Available (Smart Search Active)'}")
+    print("🔍 Elasticsearch: connecting in the background (Smart Search active meanwhile)")
     print("🧠 Smart Search Features:")
     print("   ✅ Case-insensitive matching")
     print("   ✅ Fuzzy matching for typos")
     print("   ✅ Auto-correct suggestions")
     print("   ✅ Alternative name matching")
     print("   ✅ Ingredient-based search")
-    print("🌐 Server starting on http://0.0.0.0:8080")
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    print("🌐 Development server starting on http://0.0.0.0:8080 (use gunicorn -c gunicorn.conf.py in production)")
+    app.run(host='0.0.0.0', port=8080, threaded=True)
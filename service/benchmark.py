@@ -0,0 +1,337 @@
+"""
+Benchmark and load-test suite for the food semantic web service.
+
+Builds synthetic food_mappings catalogues, times the in-memory search
+structures on them, and load-tests the HTTP routes through an in-process
+Flask client. Results are written as JSON so that runs on two commits can
+be compared:
+    
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MICRO_SIZES = [1000, 10000, 100000]  # add 1000000 with --sizes for the full range
+LOAD_SIZE = 10000
+LOAD_REQUESTS = 2000  # per endpoint
+LOAD_CONCURRENCY = 8
+QUERY_COUNT = 200  # queries timed per microbenchmark
+IMAGE_FOODS = 50  # foods given a generated image in the load test
+
+# Vocabulary of the synthetic catalogues, shaped like food_mappings.json
+BASES = ("bread rice beans stew curry bobotie boerewors chakalaka pap samoosa roti bunny chow "
+         "koeksister melktert biltong droewors vetkoek potjie sosatie braai frikkadel bredie "
+         "atchar mealie pumpkin fritters malva pudding rusks umngqusho morogo amasi pilau "
+         "biryani dhal bhaji pakora naan bhature puri halwa soup salad pie tart wrap").split()
+MODIFIERS = ("spicy sweet smoked grilled fried baked slow-cooked curried creamy crispy "
+             "traditional cape malay durban karoo township homestyle mild hot garlic lemon "
+             "peri-peri chutney honey coconut").split()
+INGREDIENTS = ("Beef Lamb Chicken Pork Fish Maize meal Wheat flour Rice Beans Lentils Potato "
+               "Pumpkin Spinach Cabbage Tomato Onion Garlic Ginger Chili Curry powder Turmeric "
+               "Yogurt Milk Egg Butter Sugar Syrup Coconut Apricot Raisins Peanuts Oil Yeast").split()
+ONTOLOGY_CLASSES = ["CookedFood", "RawFood", "Vegetables", "Fruit", "FoodAdditive"]
+FOOD_TYPES = ["MainFood", "RawFood", "Ingredient"]
+CATEGORIES = ["Bread", "Stew", "Curry", "Sausage", "Dessert", "Snack", "Side Dish", "Soup", "Salad", "Dried Meat"]
+REGIONS = ["South Africa", "South African Indian", "Cape Malay", "International"]
+PREPARATIONS = ["Baked", "Cooked", "Deep-fried", "Dried", "Fresh", "Fried", "Grilled", "Slow-cooked", "Stewed"]
+CULTURAL_ORIGINS = ["Afrikaner", "Zulu", "Xhosa", "Indian-South African", "Cape Malay", "Traditional"]
+NUTRITIONAL_FOCUS = ["Carbohydrates", "Fat", "Fiber", "Protein", "Vitamins"]
+
+def synthetic_catalogue(size, seed=0):
+    """A food_mappings dict of size foods with realistic names and properties"""
+    rng = random.Random(seed)
+    food_mappings = {}
+    while len(food_mappings) < size:
+        words = rng.sample(MODIFIERS, rng.randint(0, 2)) + [rng.choice(BASES)]
+        if rng.random() < 0.3:
+            words += ["with", rng.choice(BASES)]
+        name = ' '.join(words)
+        name = name[0].upper() + name[1:]
+        if rng.random() < 0.15:
+            name += f" ({rng.choice(MODIFIERS)} {rng.choice(BASES)})"
+        if name in food_mappings:
+            name += f" {len(food_mappings)}"
+        
+        food_mappings[name] = {
+            "ontology_class": rng.choice(ONTOLOGY_CLASSES),
+            "food_type": rng.choice(FOOD_TYPES),
+            "category": rng.choice(CATEGORIES),
+            "region": rng.choice(REGIONS),
+            "preparation": rng.choice(PREPARATIONS),
+            "primary_ingredients": rng.sample(INGREDIENTS, rng.randint(1, 5)),
+            "cultural_origin": rng.choice(CULTURAL_ORIGINS),
+            "nutritional_focus": rng.choice(NUTRITIONAL_FOCUS)
+        }
+    return food_mappings
+
+def _typo(word, rng):
+    """word with one character deleted, replaced or transposed"""
+    if len(word) < 3:
+        return word
+    position = rng.randrange(len(word) - 1)
+    edit = rng.choice(('delete', 'replace', 'transpose'))
+    if edit == 'delete':
+        return word[:position] + word[position + 1:]
+    if edit == 'replace':
+        return word[:position] + rng.choice('abcdefghijklmnopqrstuvwxyz') + word[position + 1:]
+    return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+def query_mix(food_mappings, count, seed=0):
+    """Search queries shaped like real traffic: (kind, query) pairs"""
+    rng = random.Random(seed)
+    names = list(food_mappings)
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        kind = rng.choice(('exact', 'prefix', 'ingredient', 'typo', 'miss'))
+        if kind == 'exact':
+            query = name
+        elif kind == 'prefix':
+            query = name.lower()[:rng.randint(2, 8)]
+        elif kind == 'ingredient':
+            query = rng.choice(food_mappings[name]['primary_ingredients']).lower()
+        elif kind == 'typo':
+            query = _typo(name.split()[0].lower(), rng)
+        else:
+            query = ''.join(rng.choice('qxzjvkw') for _ in range(rng.randint(4, 8)))
+        queries.append((kind, query))
+    return queries
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles in milliseconds, and throughput when the wall time is given"""
+    ordered = sorted(samples)
+    
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3)
+    
+    summary = {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+    summary["ops_per_s"] = round(len(ordered) / (elapsed if elapsed is not None else sum(ordered)), 1)
+    return summary
+
+def _timed(function, arguments):
+    """Per-call durations of function over a list of arguments"""
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def run_microbenchmarks(app_module, sizes, seed=0):
+    """Build, snapshot load, search and suggestion timings of SmartSearchEngine per catalogue size"""
+    results = {}
+    for size in sizes:
+        print(f"📏 Microbenchmarks on {size} foods...", file=sys.stderr)
+        food_mappings = synthetic_catalogue(size, seed)
+        
+        start = time.perf_counter()
+        engine = app_module.SmartSearchEngine(food_mappings)
+        build_s = time.perf_counter() - start
+        
+        queries = query_mix(food_mappings, QUERY_COUNT, seed)
+        search_samples = _timed(engine.smart_search, [query for _, query in queries])
+        by_kind = {}
+        for (kind, _), sample in zip(queries, search_samples):
+            by_kind.setdefault(kind, []).append(sample)
+        
+        # Index snapshots only exist from the commit that introduced them on
+        snapshot_load_s = None
+        if hasattr(engine, 'write_snapshot'):
+            with tempfile.TemporaryDirectory() as snapshot_dir:
+                snapshot_path = os.path.join(snapshot_dir, 'foods.search-index')
+                engine.write_snapshot(snapshot_path, 'benchmark')
+                start = time.perf_counter()
+                app_module.SmartSearchEngine.load_snapshot(snapshot_path, food_mappings, 'benchmark')
+                snapshot_load_s = round(time.perf_counter() - start, 3)
+        
+        results[str(size)] = {
+            "build_s": round(build_s, 3),
+            "snapshot_load_s": snapshot_load_s,
+            "terms": len(engine.search_index),
+            "smart_search": summarize(search_samples),
+            "smart_search_by_kind": {kind: summarize(samples) for kind, samples in sorted(by_kind.items())},
+            "suggest_corrections": summarize(_timed(engine.suggest_corrections, [query for _, query in queries]))
+        }
+    return results
+
+def _write_fixture(directory, food_mappings, seed=0):
+    """Write a mappings file and a few food images for the load test"""
+    mappings_file = os.path.join(directory, 'food_mappings.json')
+    with open(mappings_file, 'w', encoding='utf-8') as f:
+        json.dump({"food_mappings": food_mappings}, f)
+    
+    images_path = os.path.join(directory, 'images')
+    rng = random.Random(seed)
+    for food_name in rng.sample(list(food_mappings), min(IMAGE_FOODS, len(food_mappings))):
+        food_dir = os.path.join(images_path, food_name)
+        os.makedirs(food_dir)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1024, 768), color).save(os.path.join(food_dir, '1.jpg'), quality=85)
+    return mappings_file, images_path
+
+def _load_test(app, paths, concurrency):
+    """Latencies and throughput of GET requests spread over concurrent in-process clients"""
+    per_worker = [paths[i::concurrency] for i in range(concurrency)]
+    statuses = {}
+    cache_hits = 0
+    
+    def worker(worker_paths):
+        client = app.test_client()
+        samples = []
+        worker_statuses = {}
+        worker_hits = 0
+        for path in worker_paths:
+            start = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            samples.append(time.perf_counter() - start)
+            worker_statuses[response.status_code] = worker_statuses.get(response.status_code, 0) + 1
+            worker_hits += response.headers.get('X-Cache') == 'HIT'
+        return samples, worker_statuses, worker_hits
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(worker, per_worker))
+    elapsed = time.perf_counter() - start
+    
+    samples = []
+    for worker_samples, worker_statuses, worker_hits in outcomes:
+        samples += worker_samples
+        cache_hits += worker_hits
+        for status, count in worker_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    
+    summary = summarize(samples, elapsed)
+    summary["statuses"] = statuses
+    if cache_hits:
+        summary["cache_hit_rate"] = round(cache_hits / len(samples), 3)
+    return summary
+
+def run_load_test(app_module, size, requests_count, concurrency, seed=0):
+    """Load-test the HTTP routes of an app serving a synthetic catalogue"""
+    from urllib.parse import quote, urlencode
+    
+    print(f"🚚 Load test on {size} foods, {requests_count} requests per route, "
+          f"{concurrency} concurrent clients...", file=sys.stderr)
+    food_mappings = synthetic_catalogue(size, seed)
+    directory = tempfile.mkdtemp(prefix='food-benchmark-')
+    try:
+        mappings_file, images_path = _write_fixture(directory, food_mappings, seed)
+        app_module.MAPPINGS_FILE = mappings_file
+        app_module.IMAGES_PATH = images_path
+        app_module.IMAGE_CACHE_PATH = os.path.join(directory, 'image_cache')
+        app_module.MAPPINGS_WATCH_INTERVAL = 0
+        
+        start = time.perf_counter()
+        app = app_module.create_app(start_pollers=False)
+        startup_s = time.perf_counter() - start
+        
+        rng = random.Random(seed)
+        queries = [query for _, query in query_mix(food_mappings, requests_count, seed)]
+        image_foods = sorted(os.listdir(images_path))
+        
+        def facet_filters():
+            filters = {}
+            if rng.random() < 0.5:
+                filters['region'] = rng.choice(REGIONS)
+            if rng.random() < 0.5:
+                filters['category'] = rng.choice(CATEGORIES)
+            filters['limit'] = rng.choice((20, 50))
+            return urlencode(filters)
+        
+        routes = {
+            "search": [f"/api/search?{urlencode({'q': query})}" for query in queries],
+            "search_suggest": [f"/api/search/suggest?{urlencode({'q': query[:rng.randint(1, len(query))]})}"
+                               for query in queries if query],
+            "foods_all": [f"/api/foods/all?{facet_filters()}" for _ in range(requests_count)],
+            "image": [f"/api/food/{quote(rng.choice(image_foods))}/image" for _ in range(requests_count)],
+            "image_variant": [f"/api/food/{quote(rng.choice(image_foods))}/image?w=160&format=webp"
+                              for _ in range(requests_count)]
+        }
+        
+        results = {"foods": size, "startup_s": round(startup_s, 3)}
+        for route, paths in routes.items():
+            results[route] = _load_test(app, paths, concurrency)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous, path=()):
+    """Ratios current/previous of the latency percentiles present in both reports"""
+    ratios = {}
+    for key, value in current.items():
+        other = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict) and isinstance(other, dict):
+            ratios.update(compare(value, other, path + (key,)))
+        elif key in ('p50_ms', 'p95_ms', 'p99_ms') and other:
+            ratios['.'.join(path + (key,))] = round(value / other, 3)
+    return ratios
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search structures and load-test the HTTP routes")
+    parser.add_argument('--sizes', default=','.join(map(str, MICRO_SIZES)),
+                        help="comma-separated catalogue sizes for the microbenchmarks")
+    parser.add_argument('--load-size', type=int, default=LOAD_SIZE, help="catalogue size for the load test, 0 skips it")
+    parser.add_argument('--requests', type=int, default=LOAD_REQUESTS, help="requests per route in the load test")
+    parser.add_argument('--concurrency', type=int, default=LOAD_CONCURRENCY, help="concurrent in-process clients")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--compare', help="JSON report of a previous run to compute latency ratios against")
+    args = parser.parse_args()
+    
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "seed": args.seed
+        },
+        "micro": run_microbenchmarks(app_module, [int(size) for size in args.sizes.split(',') if size], args.seed)
+    }
+    if args.load_size:
+        report["load"] = run_load_test(app_module, args.load_size, args.requests, args.concurrency, args.seed)
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report["comparison"] = {"against": args.compare, "ratios": compare(report, json.load(f))}
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✅ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Shared fixtures of the service tests: the app module pointed at a temporary
+data directory, and an app serving a small synthetic catalogue from it.
+"""
+from PIL import Image
+import json
+import os
+import pytest
+
+import app as app_module
+from benchmark import synthetic_catalogue
+
+# test_search.py is a script run against a live server, not a test module
+collect_ignore = ["test_search.py"]
+
+ONTOLOGY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'WebSemantics.rdf')
+CATALOGUE_SIZE = 120
+IMAGE_FOOD = "Test food with image"
+
+@pytest.fixture
+def catalogue():
+    return synthetic_catalogue(CATALOGUE_SIZE)
+
+@pytest.fixture
+def service_module(tmp_path, monkeypatch, catalogue):
+    """The app module with every file it reads or writes under tmp_path"""
+    food_mappings = dict(catalogue)
+    food_mappings[IMAGE_FOOD] = {"ontology_class": "CookedFood", "category": "Bread", "region": "Cape Malay"}
+    mappings_file = tmp_path / 'food_mappings.json'
+    mappings_file.write_text(json.dumps({"food_mappings": food_mappings}), encoding='utf-8')
+    
+    image_dir = tmp_path / 'images' / IMAGE_FOOD
+    image_dir.mkdir(parents=True)
+    Image.new('RGB', (64, 48), (200, 120, 40)).save(image_dir / '1.jpg', quality=85)
+    
+    monkeypatch.setattr(app_module, 'MAPPINGS_FILE', str(mappings_file))
+    monkeypatch.setattr(app_module, 'ONTOLOGY_FILE', ONTOLOGY_FILE)
+    monkeypatch.setattr(app_module, 'IMAGES_PATH', str(tmp_path / 'images'))
+    monkeypatch.setattr(app_module, 'IMAGE_CACHE_PATH', str(tmp_path / 'image_cache'))
+    monkeypatch.setattr(app_module, 'ONTOLOGY_EXPORT_CACHE_PATH', str(tmp_path / 'export_cache'))
+    monkeypatch.setattr(app_module, 'PUBLISHER_LOCK_FILE', str(tmp_path / 'publisher.lock'))
+    monkeypatch.setattr(app_module, 'RELOAD_REQUEST_FILE', str(tmp_path / 'reload.request'))
+    monkeypatch.setattr(app_module, 'RELOAD_PUBLISHED_FILE', str(tmp_path / 'reload.published'))
+    monkeypatch.setattr(app_module, 'MAPPINGS_WATCH_INTERVAL', 0)
+    return app_module
+
+@pytest.fixture
+def client(service_module):
+    """Test client of an app serving the catalogue, without Elasticsearch or pollers"""
+    return service_module.create_app(start_pollers=False).test_client()
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the food semantic web service.
+
+Run from the service directory with: gunicorn -c gunicorn.conf.py
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+wsgi_app = "app:create_app(start_pollers=False)"
+
+# One process per core for the CPU-bound search code, threads for the I/O-bound routes
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+# Build the indexes once in the master; workers share them copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+accesslog = '-'
+errorlog = '-'
+
+def pre_fork(server, worker):
+    # Keep the garbage collector from touching, and so copying, the shared objects
+    gc.freeze()
+
+def post_worker_init(worker):
+    import app
+    app.after_fork()
@@ -1,116 +1,532 @@
 """
 Script to populate the knowledge base with food instances using JSON mappings
 """
-from rdflib import Graph, Namespace, RDF, RDFS, Literal, URIRef
+from rdflib import Graph, Namespace, RDF, RDFS, Literal, URIRef, BNode
 from SPARQLWrapper import SPARQLWrapper, POST, DIGEST
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import argparse
+import logging
 import os
 import requests
 import json
+import sys
+import time
 
 FUSEKI_UPDATE_ENDPOINT = "http://localhost:3030/food-kb/update"
+FUSEKI_DATA_ENDPOINT = "http://localhost:3030/food-kb/data"  # Graph Store Protocol, default graph
 IMAGES_PATH = "/app/data/images"
 MAPPINGS_FILE = "/app/data/food_mappings.json"
+ONTOLOGY_FILE = "/app/data/ontology/WebSemantics.rdf"
 ONTOLOGY_NS = Namespace("http://www.semanticweb.org/zaz/ontologies/2025/4/untitled-ontology-8#")
 
-def load_food_mappings():
-    """Load food mappings from JSON file"""
-    try:
-        with open(MAPPINGS_FILE, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('food_mappings', {})
-    except FileNotFoundError:
-        print(f"Mappings file not found: {MAPPINGS_FILE}")
-        return {}
-    except json.JSONDecodeError as e:
-        print(f"Error parsing mappings file: {e}")
-        return {}
+# The dataset's default graph is the union of its named graphs (see fuseki-config.ttl), so
+# queries see the ontology, the foods and the inferences together as plain patterns
+GRAPHS_NS = "http://www.semanticweb.org/zaz/ontologies/2025/4/untitled-ontology-8/graphs/"
+FOODS_GRAPH = URIRef(GRAPHS_NS + "foods")  # asserted food triples
+INFERENCE_GRAPH = URIRef(GRAPHS_NS + "inferred")  # materialized entailments
+
+# N-Triples escapes: literals may not hold raw quotes, backslashes or line breaks, and IRIs
+# may not hold spaces or these delimiters; control characters become \u escapes in both
+_CONTROL_ESCAPES = {code: f'\\u{code:04X}' for code in (*range(0x20), 0x7F)}
+_LITERAL_ESCAPES = {**_CONTROL_ESCAPES, ord('\\'): '\\\\', ord('"'): '\\"',
+                    ord('\n'): '\\n', ord('\r'): '\\r', ord('\t'): '\\t'}
+_IRI_ESCAPES = {**_CONTROL_ESCAPES, **{ord(char): f'\\u{ord(char):04X}' for char in ' <>"{}|^`\\'}}
 
-def populate_knowledge_base():
-    """Populate the knowledge base with food instances from JSON mappings"""
+BATCH_SIZE = 5000  # triples per request
+PARALLEL_BATCHES = 4
+READ_CHUNK_SIZE = 1 << 16  # characters read at a time from the mappings file
+
+class _JSONStream:
+    """Reads JSON values one at a time from a file, keeping only a small buffer"""
     
-    # Load food mappings from JSON
-    food_mappings = load_food_mappings()
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
     
-    if not food_mappings:
-        print("No food mappings found. Exiting.")
-        return
+    def _fill(self):
+        """Read the next chunk, dropping what has already been consumed"""
+        chunk = self.f.read(READ_CHUNK_SIZE)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+    
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
     
-    # Create RDF graph
-    g = Graph()
-    g.bind("", ONTOLOGY_NS)
-    g.bind("rdfs", RDFS)
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be char"""
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
     
-    # Add food instances with comprehensive data
-    for food_name, properties in food_mappings.items():
-        # Create URI for food instance
-        safe_name = food_name.replace(' ', '_').replace(',', '').replace('(', '').replace(')', '').replace("'", "")
-        food_uri = ONTOLOGY_NS[safe_name]
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value running up to the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def _iter_object(stream):
+    """Yield the (key, value) pairs of the JSON object at the stream position"""
+    stream.expect('{')
+    while stream.peek() != '}':
+        key = stream.value()
+        stream.expect(':')
+        yield key, stream.value()
+        if stream.peek() == ',':
+            stream.expect(',')
+    stream.expect('}')
+
+def iter_section(path, section):
+    """Yield the (key, value) pairs of a section of the mappings file one at a
+    time, without loading the whole file into memory"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f)
+        stream.expect('{')
         
-        # Add basic triples
-        ontology_class = properties.get('ontology_class', 'Food')
-        g.add((food_uri, RDF.type, ONTOLOGY_NS[ontology_class]))
-        g.add((food_uri, RDFS.label, Literal(food_name)))
+        while stream.peek() != '}':
+            key = stream.value()
+            stream.expect(':')
+            
+            if key == section:
+                yield from _iter_object(stream)
+                return
+            if stream.peek() == '{':
+                for _ in _iter_object(stream):
+                    pass  # skipped entry by entry, food_mappings can be large
+            else:
+                stream.value()
+            
+            if stream.peek() == ',':
+                stream.expect(',')
+
+def iter_food_mappings(path=MAPPINGS_FILE):
+    """Yield (food_name, properties) pairs from the mappings file one at a time,
+    without loading the whole food_mappings object into memory"""
+    yield from iter_section(path, 'food_mappings')
+
+# Detailed properties from the JSON mapping and their RDF counterparts
+PROPERTY_MAPPINGS = {
+    'food_type': 'hasType',
+    'category': 'hasCategory', 
+    'region': 'belongsToRegion',
+    'preparation': 'hasPreparation',
+    'cultural_origin': 'hasCulturalOrigin',
+    'nutritional_focus': 'hasNutritionalFocus'
+}
+
+def food_uri(food_name):
+    """URI of a food instance"""
+    safe_name = food_name.replace(' ', '_').replace(',', '').replace('(', '').replace(')', '').replace("'", "")
+    return ONTOLOGY_NS[safe_name]
+
+def food_triples(food_name, properties):
+    """Generate the triples describing a single food"""
+    uri = food_uri(food_name)
+    
+    # Add basic triples
+    ontology_class = properties.get('ontology_class', 'Food')
+    yield (uri, RDF.type, ONTOLOGY_NS[ontology_class])
+    yield (uri, RDFS.label, Literal(food_name))
+    
+    for json_prop, rdf_prop in PROPERTY_MAPPINGS.items():
+        if json_prop in properties:
+            yield (uri, ONTOLOGY_NS[rdf_prop], Literal(properties[json_prop]))
+    
+    # Add primary ingredients
+    if 'primary_ingredients' in properties:
+        for ingredient in properties['primary_ingredients']:
+            yield (uri, ONTOLOGY_NS.hasIngredient, Literal(ingredient))
+    
+    # Check if image exists
+    if os.path.exists(os.path.join(IMAGES_PATH, food_name)):
+        yield (uri, ONTOLOGY_NS.hasImage, Literal(True))
+        yield (uri, ONTOLOGY_NS.imagePath, Literal(f"/api/food/{food_name}/image"))
+    else:
+        yield (uri, ONTOLOGY_NS.hasImage, Literal(False))
+
+def _transitive_closure(pairs):
+    """Map every a of a relation given as (a, b) pairs to all the b reachable from it"""
+    direct = {}
+    for a, b in pairs:
+        direct.setdefault(a, set()).add(b)
+    
+    closure = {}
+    for start, targets in direct.items():
+        reachable = set()
+        stack = list(targets)
+        while stack:
+            node = stack.pop()
+            if node not in reachable:
+                reachable.add(node)
+                stack.extend(direct.get(node, ()))
+        closure[start] = reachable
+    return closure
+
+class Reasoner:
+    """Forward-chaining RDFS / OWL RL rules over the ontology schema.
+    
+    The schema closures (scm-sco, scm-spo) are computed once. The rules
+    applied to instances - superclass types (cax-sco), super-properties
+    (prp-spo1) and domain types (prp-dom) - only conclude about the subject
+    of the triples they start from, so the entailments of a food depend on
+    its own triples alone and are recomputed on their own when it changes.
+    """
+    
+    def __init__(self, schema, class_parents=()):
+        self.schema = schema
+        self.superclasses = _transitive_closure(
+            [(c, d) for c, d in schema.subject_objects(RDFS.subClassOf)
+             if isinstance(c, URIRef) and isinstance(d, URIRef)] + list(class_parents))
+        self.superproperties = _transitive_closure(
+            (p, q) for p, q in schema.subject_objects(RDFS.subPropertyOf)
+            if isinstance(p, URIRef) and isinstance(q, URIRef))
+        self.domains = {}
+        for prop, domain in schema.subject_objects(RDFS.domain):
+            if isinstance(domain, URIRef):
+                self.domains.setdefault(prop, set()).add(domain)
+    
+    def schema_triples(self):
+        """Entailed subclass and sub-property statements that the schema does not assert"""
+        for predicate, closure in ((RDFS.subClassOf, self.superclasses),
+                                   (RDFS.subPropertyOf, self.superproperties)):
+            for a, ancestors in closure.items():
+                for b in ancestors:
+                    if (a, predicate, b) not in self.schema:
+                        yield (a, predicate, b)
+    
+    def entailments(self, triples):
+        """Triples entailed by those of a food that it does not assert itself"""
+        asserted = set(triples)
+        facts = set(asserted)
         
-        # Add detailed properties from JSON mapping
-        property_mappings = {
-            'food_type': 'hasType',
-            'category': 'hasCategory', 
-            'region': 'belongsToRegion',
-            'preparation': 'hasPreparation',
-            'cultural_origin': 'hasCulturalOrigin',
-            'nutritional_focus': 'hasNutritionalFocus'
-        }
+        # prp-spo1: a statement also holds for the super-properties of its predicate
+        for subject, predicate, obj in asserted:
+            for superproperty in self.superproperties.get(predicate, ()):
+                facts.add((subject, superproperty, obj))
         
-        for json_prop, rdf_prop in property_mappings.items():
-            if json_prop in properties:
-                g.add((food_uri, ONTOLOGY_NS[rdf_prop], Literal(properties[json_prop])))
+        # prp-dom: the subject of a property is an instance of its domains
+        for subject, predicate, obj in list(facts):
+            for domain in self.domains.get(predicate, ()):
+                facts.add((subject, RDF.type, domain))
         
-        # Add primary ingredients
-        if 'primary_ingredients' in properties:
-            for ingredient in properties['primary_ingredients']:
-                g.add((food_uri, ONTOLOGY_NS.hasIngredient, Literal(ingredient)))
+        # cax-sco: an instance of a class is an instance of its superclasses
+        for subject, predicate, obj in list(facts):
+            if predicate == RDF.type:
+                for superclass in self.superclasses.get(obj, ()):
+                    facts.add((subject, RDF.type, superclass))
         
-        # Check if image exists
-        if os.path.exists(os.path.join(IMAGES_PATH, food_name)):
-            g.add((food_uri, ONTOLOGY_NS.hasImage, Literal(True)))
-            g.add((food_uri, ONTOLOGY_NS.imagePath, Literal(f"/api/food/{food_name}/image")))
-        else:
-            g.add((food_uri, ONTOLOGY_NS.hasImage, Literal(False)))
-    
-    # Convert to SPARQL INSERT query
-    turtle_data = g.serialize(format='turtle')
-    
-    insert_query = f"""
-    PREFIX : <{ONTOLOGY_NS}>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    
-    INSERT DATA {{
-        {turtle_data}
-    }}
+        return facts - asserted
+
+def load_reasoner(ontology_file=ONTOLOGY_FILE, ontology_classes=None):
+    """Reasoner over the ontology, and over the parent classes declared in
+    the ontology_classes of the mappings"""
+    schema = Graph()
+    try:
+        schema.parse(ontology_file, format='xml')
+    except FileNotFoundError:
+        print(f"Ontology file not found: {ontology_file}")
+    
+    class_parents = [(ONTOLOGY_NS[class_name], ONTOLOGY_NS[class_info['parent']])
+                     for class_name, class_info in (ontology_classes or {}).items()
+                     if class_info.get('parent')]
+    return Reasoner(schema, class_parents)
+
+def update_foods(upserts, removed, reasoner=None):
+    """Apply food changes to the knowledge base in a single SPARQL update.
+    
+    upserts maps the names of added or changed foods to their properties;
+    their previous triples are replaced. removed lists foods to delete.
+    With a reasoner, the inferred triples of these foods are replaced too.
     """
+    graphs = [FOODS_GRAPH, INFERENCE_GRAPH] if reasoner else [FOODS_GRAPH]
+    operations = []
+    for food_name in list(removed) + list(upserts):
+        for graph in graphs:
+            operations.append(f"DELETE WHERE {{ GRAPH <{graph}> {{ <{food_uri(food_name)}> ?p ?o }} }}")
+    
+    if upserts:
+        g = Graph()
+        inferred = Graph()
+        for food_name, properties in upserts.items():
+            triples = list(food_triples(food_name, properties))
+            for triple in triples:
+                g.add(triple)
+            if reasoner:
+                for triple in reasoner.entailments(triples):
+                    inferred.add(triple)
+        operations.append(f"INSERT DATA {{ GRAPH <{FOODS_GRAPH}> {{\n{''.join(map(ntriples_line, g))}\n}} }}")
+        if len(inferred):
+            operations.append(f"INSERT DATA {{ GRAPH <{INFERENCE_GRAPH}> {{\n{''.join(map(ntriples_line, inferred))}\n}} }}")
+    
+    if not operations:
+        return
+    
+    response = requests.post(
+        FUSEKI_UPDATE_ENDPOINT,
+        data={'update': ' ;\n'.join(operations)},
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        timeout=30
+    )
+    response.raise_for_status()
+
+def create_session(pool_size=PARALLEL_BATCHES):
+    """HTTP session keeping one keep-alive connection per parallel batch"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=3)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def ntriples_term(term):
+    """Serialize an RDF term for N-Triples.
+    
+    Unlike term.n3(), which writes multi-line literals between triple
+    quotes as Turtle does, every literal is a single-line quoted string.
+    """
+    if isinstance(term, Literal):
+        quoted = '"' + str(term).translate(_LITERAL_ESCAPES) + '"'
+        if term.language:
+            return f"{quoted}@{term.language}"
+        if term.datatype:
+            return f"{quoted}^^<{str(term.datatype).translate(_IRI_ESCAPES)}>"
+        return quoted
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    return f"<{str(term).translate(_IRI_ESCAPES)}>"
+
+def ntriples_line(triple):
+    """Serialize a triple as an N-Triples line"""
+    subject, predicate, obj = triple
+    return f"{ntriples_term(subject)} {ntriples_term(predicate)} {ntriples_term(obj)} .\n"
+
+def iter_batches(food_items, batch_size=BATCH_SIZE, reasoner=None):
+    """Group the triples of a stream of foods into N-Triples batches.
+    
+    Yields (lines, inferred_lines, food_count) tuples, inferred_lines being
+    the entailments of the foods when a reasoner is given; a food's triples
+    are never split across two batches.
+    """
+    lines = []
+    inferred_lines = []
+    food_count = 0
+    for food_name, properties in food_items:
+        triples = list(food_triples(food_name, properties))
+        lines.extend(ntriples_line(triple) for triple in triples)
+        if reasoner:
+            inferred_lines.extend(ntriples_line(triple) for triple in reasoner.entailments(triples))
+        food_count += 1
+        if len(lines) + len(inferred_lines) >= batch_size:
+            yield lines, inferred_lines, food_count
+            lines, inferred_lines, food_count = [], [], 0
+    if lines:
+        yield lines, inferred_lines, food_count
+
+def post_batch(session, lines, graph=FOODS_GRAPH):
+    """Load a batch of N-Triples lines into a named graph.
+    
+    A batch rejected as malformed (400) is split in halves and retried, so
+    that one bad triple only costs itself. Any other error is raised, so
+    that a full load stops before its staging graphs are swapped in.
+    Returns the number of (loaded, failed) triples.
+    """
+    response = session.post(
+        FUSEKI_DATA_ENDPOINT,
+        params={'graph': str(graph)},
+        data=''.join(lines).encode('utf-8'),
+        headers={'Content-Type': 'application/n-triples; charset=utf-8'},
+        timeout=60
+    )
+    if response.ok:
+        return len(lines), 0
+    
+    if response.status_code != 400:
+        response.raise_for_status()
+    if len(lines) == 1:
+        print(f"Error loading triple: {response.status_code} - {response.text[:200]}")
+        logging.error(f"Triple not loaded ({response.status_code}): {lines[0].rstrip()}")
+        return 0, 1
+    
+    middle = len(lines) // 2
+    first_loaded, first_failed = post_batch(session, lines[:middle], graph)
+    second_loaded, second_failed = post_batch(session, lines[middle:], graph)
+    return first_loaded + second_loaded, first_failed + second_failed
+
+def post_food_batch(session, lines, inferred_lines):
+    """Load a batch of food triples and their entailments, each into the
+    staging copy of its graph. Returns the number of (loaded, failed) triples."""
+    loaded, failed = post_batch(session, lines, staging_graph(FOODS_GRAPH))
+    if inferred_lines:
+        inferred_loaded, inferred_failed = post_batch(session, inferred_lines, staging_graph(INFERENCE_GRAPH))
+        loaded += inferred_loaded
+        failed += inferred_failed
+    return loaded, failed
+
+def replace_graph(session, graph, lines):
+    """Replace the content of a named graph with N-Triples lines"""
+    response = session.put(
+        FUSEKI_DATA_ENDPOINT,
+        params={'graph': str(graph)},
+        data=''.join(lines).encode('utf-8'),
+        headers={'Content-Type': 'application/n-triples; charset=utf-8'},
+        timeout=60
+    )
+    response.raise_for_status()
+
+def staging_graph(graph):
+    """Graph a full load writes into before it replaces graph"""
+    return URIRef(str(graph) + "-staging")
+
+def run_update(session, operations):
+    """Run SPARQL update operations as one request, so one transaction"""
+    response = session.post(
+        FUSEKI_UPDATE_ENDPOINT,
+        data={'update': ' ;\n'.join(operations)},
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        timeout=60
+    )
+    response.raise_for_status()
+
+def clear_staging(session, graphs):
+    """Drop what an interrupted full load left in the staging graphs"""
+    run_update(session, [f"DROP SILENT GRAPH <{staging_graph(graph)}>" for graph in graphs])
+
+def swap_in_staging(session, graphs):
+    """Replace graphs with their staging copies at once, so that readers
+    never see a half-loaded graph or the foods and inferences disagree"""
+    operations = []
+    for graph in graphs:
+        staging = staging_graph(graph)
+        operations += [f"DROP SILENT GRAPH <{graph}>",
+                       f"ADD SILENT GRAPH <{staging}> TO GRAPH <{graph}>",
+                       f"DROP SILENT GRAPH <{staging}>"]
+    run_update(session, operations)
+
+def materialize_inferences(food_items, reasoner, batch_size=BATCH_SIZE):
+    """Recompute the whole inferred graph: the schema entailments, then those
+    of every food, e.g. after the class hierarchy changed"""
+    session = create_session(1)
+    staging = staging_graph(INFERENCE_GRAPH)
+    try:
+        clear_staging(session, [INFERENCE_GRAPH])
+        replace_graph(session, staging, [ntriples_line(triple) for triple in reasoner.schema_triples()])
+        for _, inferred_lines, _ in iter_batches(food_items, batch_size, reasoner):
+            if inferred_lines:
+                post_batch(session, inferred_lines, staging)
+        swap_in_staging(session, [INFERENCE_GRAPH])
+    finally:
+        session.close()
+
+def populate_knowledge_base(mappings_file=MAPPINGS_FILE, batch_size=BATCH_SIZE, workers=PARALLEL_BATCHES,
+                            ontology_file=ONTOLOGY_FILE, infer=True):
+    """Populate the knowledge base with food instances from JSON mappings.
+    
+    Foods are streamed from the mappings file and their triples are sent in
+    fixed-size N-Triples batches over pooled connections, several batches
+    in flight at a time, so memory stays bounded whatever the file size.
+    
+    With infer, the RDFS / OWL RL entailments of the ontology and of every
+    food are computed along the way, so that queries need no reasoning at
+    query time.
+    
+    Both graphs are loaded into staging graphs and swapped in together once
+    the load completes, so foods removed from the file since the last load
+    do not linger and the inferences always match the foods. Returns whether
+    the load was swapped in; on failure the live graphs are left untouched.
+    """
+    session = create_session(workers)
+    start_time = time.time()
+    foods = loaded = failed = 0
+    
+    def report(future, batch_foods):
+        nonlocal foods, loaded, failed
+        batch_loaded, batch_failed = future.result()
+        foods += batch_foods
+        loaded += batch_loaded
+        failed += batch_failed
+        elapsed = time.time() - start_time
+        print(f"  {foods} foods, {loaded} triples loaded ({loaded / max(elapsed, 1e-6):.0f} triples/s)"
+              + (f", {failed} failed" if failed else ""))
     
-    # Send to Fuseki
     try:
-        response = requests.post(
-            FUSEKI_UPDATE_ENDPOINT,
-            data={'update': insert_query},
-            headers={'Content-Type': 'application/x-www-form-urlencoded'}
-        )
+        clear_staging(session, [FOODS_GRAPH, INFERENCE_GRAPH])
+        reasoner = None
+        if infer:
+            reasoner = load_reasoner(ontology_file, dict(iter_section(mappings_file, 'ontology_classes')))
+            schema_lines = [ntriples_line(triple) for triple in reasoner.schema_triples()]
+            replace_graph(session, staging_graph(INFERENCE_GRAPH), schema_lines)
+            loaded += len(schema_lines)
         
-        if response.status_code == 200:
-            print(f"Knowledge base populated successfully with {len(food_mappings)} food items!")
-            print("Added properties for each food:")
-            print("- Ontology class classification")
-            print("- Regional and cultural information") 
-            print("- Preparation methods")
-            print("- Nutritional focus")
-            print("- Primary ingredients")
-            print("- Image availability")
-        else:
-            print(f"Error populating KB: {response.status_code} - {response.text}")
-            
+        batches = iter_batches(iter_food_mappings(mappings_file), batch_size, reasoner)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for lines, inferred_lines, batch_foods in batches:
+                pending.append((executor.submit(post_food_batch, session, lines, inferred_lines), batch_foods))
+                # Keep only a few batches in memory at a time
+                while len(pending) >= workers * 2:
+                    report(*pending.pop(0))
+            for future, batch_foods in pending:
+                report(future, batch_foods)
+        
+        # Without infer, the inferred graph is emptied along, as no inference matches the new foods
+        swap_in_staging(session, [FOODS_GRAPH, INFERENCE_GRAPH])
+    
+    except FileNotFoundError:
+        print(f"Mappings file not found: {mappings_file}")
+        return False
+    except json.JSONDecodeError as e:
+        print(f"Error parsing mappings file: {e}")
+        return False
     except Exception as e:
-        print(f"Error: {e}")
+        print(f"Error: knowledge base not loaded: {e}")
+        return False
+    finally:
+        session.close()
+    
+    if not foods:
+        print("No food mappings found; the knowledge base holds no foods.")
+        return True
+    
+    elapsed = time.time() - start_time
+    print(f"Knowledge base populated with {foods} food items: {loaded} triples in {elapsed:.1f}s"
+          + (f" ({failed} triples rejected)" if failed else "!"))
+    print("Added properties for each food:")
+    print("- Ontology class classification")
+    print("- Regional and cultural information") 
+    print("- Preparation methods")
+    print("- Nutritional focus")
+    print("- Primary ingredients")
+    print("- Image availability")
+    if infer:
+        print(f"- Inferred superclasses and property domains, in <{INFERENCE_GRAPH}>")
+    return True
 
 if __name__ == "__main__":
-    populate_knowledge_base()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the food mappings into the Fuseki knowledge base")
+    parser.add_argument('--mappings', default=MAPPINGS_FILE, help="food mappings JSON file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="triples per request")
+    parser.add_argument('--workers', type=int, default=PARALLEL_BATCHES, help="batches sent in parallel")
+    parser.add_argument('--ontology', default=ONTOLOGY_FILE, help="ontology RDF/XML file the inferences follow")
+    parser.add_argument('--no-inference', action='store_true', help="do not materialize the inferred graph")
+    args = parser.parse_args()
+    if not populate_knowledge_base(args.mappings, args.batch_size, args.workers, args.ontology, not args.no_inference):
+        sys.exit(1)
@@ -0,0 +1,116 @@
+"""
+Tests of the HTTP routes through an in-process client: cursor paging of
+/api/foods/all, conditional and range requests of the image routes, and
+the Server-Timing stages.
+"""
+import os
+import time
+from urllib.parse import quote
+
+from flask import g
+
+from conftest import IMAGE_FOOD
+
+def all_pages(client, query=''):
+    """Names of the foods of every page of /api/foods/all, in order"""
+    names = []
+    cursor = None
+    while True:
+        url = f"/api/foods/all?limit=7{query}" + (f"&cursor={cursor}" if cursor else '')
+        body = client.get(url).get_json()
+        names.extend(food['name'] for food in body['results'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return names, body['total_results']
+
+def test_cursor_paging_covers_every_food_once(client, service_module):
+    names, total = all_pages(client)
+    food_mappings = service_module.service.food_mappings
+    assert total == len(food_mappings)
+    assert len(names) == len(set(names))
+    assert sorted(names) == sorted(food_mappings)
+
+def test_cursor_paging_with_filters(client, service_module):
+    names, total = all_pages(client, '&region=Cape%20Malay')
+    expected = [name for name, properties in service_module.service.food_mappings.items()
+                if properties.get('region') == "Cape Malay"]
+    assert total == len(expected)
+    assert sorted(names) == sorted(expected)
+
+def test_invalid_cursor(client):
+    assert client.get('/api/foods/all?cursor=abc').status_code == 400  # bad padding
+    assert client.get('/api/foods/all?cursor=_w==').status_code == 400  # not UTF-8
+
+def test_food_records_use_the_request_base_url(client):
+    for base_url in ('http://one.example', 'https://two.example:8443'):
+        body = client.get("/api/foods/all?limit=500", base_url=base_url).get_json()
+        food = next(food for food in body['results'] if food['name'] == IMAGE_FOOD)
+        assert food['thumbnail_url'] == f"{base_url}/api/food/{quote(IMAGE_FOOD)}/image/0"
+        assert food['image_urls'][0]['full_url'] == food['image_urls'][0]['url']
+
+def test_image_etag_and_not_modified(client):
+    url = f"/api/food/{quote(IMAGE_FOOD)}/image/0"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(url, headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+    
+    variant = client.get(url + '?w=100&format=webp')
+    assert variant.status_code == 200
+    assert variant.mimetype == 'image/webp'
+    assert variant.headers['ETag'] != etag
+    assert client.get(url + '?w=100&format=webp',
+                      headers={'If-None-Match': variant.headers['ETag']}).status_code == 304
+
+def test_image_range_requests(client):
+    url = f"/api/food/{quote(IMAGE_FOOD)}/image"
+    full = client.get(url).data
+    response = client.get(url, headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 0-99/{len(full)}"
+    assert response.data == full[:100]
+    
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'Range': 'bytes=10-', 'If-Range': etag}).data == full[10:]
+
+def test_image_replaced_in_place_gets_a_new_etag(client, service_module):
+    url = f"/api/food/{quote(IMAGE_FOOD)}/image/0"
+    etag = client.get(url).headers['ETag']
+    
+    image = service_module.service.image_manifest.get(IMAGE_FOOD)[0]
+    folder_stat = os.stat(os.path.dirname(image.path))
+    with open(image.path, 'ab') as f:
+        f.write(b'\0' * 16)
+    os.utime(os.path.dirname(image.path), ns=(folder_stat.st_atime_ns, folder_stat.st_mtime_ns))
+    
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.data) == image.size + 16
+    # A range of the old version is not applied to the new one
+    assert client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code == 200
+
+def test_unknown_image(client):
+    assert client.get('/api/food/No%20such%20food/image').status_code == 404
+    assert client.get(f"/api/food/{quote(IMAGE_FOOD)}/image/5").status_code == 404
+
+def test_nested_stages_are_not_counted_twice(service_module):
+    app = service_module.create_app(start_pollers=False)
+    with app.test_request_context():
+        with service_module.timed('enrichment'):
+            with service_module.timed('image'):
+                time.sleep(0.05)
+        timings = g.timings
+    assert timings['image'] >= 0.05
+    assert timings['enrichment'] < 0.05
+
+def test_suggestion_limit(client, service_module):
+    assert client.get('/api/search/suggest?q=bre&limit=abc').status_code == 400
+    assert client.get('/api/search/suggest?q=bre&limit=-1').status_code == 400
+    assert client.get('/api/search/suggest?q=bre&limit=0').get_json() == {"error": "limit must be at least 1"}
+    body = client.get('/api/search/suggest?q=b&limit=100000').get_json()
+    assert 0 < body['total'] <= service_module.SUGGEST_MAX_LIMIT
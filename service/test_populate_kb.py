@@ -0,0 +1,35 @@
+"""
+Tests of the N-Triples written to Fuseki and served by the N-Triples export.
+"""
+from rdflib import Graph, Literal, URIRef, BNode, XSD
+
+from populate_kb import ntriples_line, ntriples_term
+
+FOOD = URIRef("http://www.semanticweb.org/zaz/ontologies/2025/4/untitled-ontology-8#Bobotie")
+COMMENT = URIRef("http://www.w3.org/2000/01/rdf-schema#comment")
+
+def parse(lines):
+    graph = Graph()
+    graph.parse(data=''.join(lines), format='nt')
+    return graph
+
+def test_multiline_literals_stay_on_one_line():
+    literal = Literal('First line\nsecond line\r\n\t"quoted" \\ backslash')
+    line = ntriples_line((FOOD, COMMENT, literal))
+    assert line.count('\n') == 1 and line.endswith(' .\n')
+    assert '"""' not in line
+    assert ntriples_term(literal) == '"First line\\nsecond line\\r\\n\\t\\"quoted\\" \\\\ backslash"'
+    assert set(parse([line])) == {(FOOD, COMMENT, literal)}
+
+def test_control_characters_and_unicode_round_trip():
+    literals = [Literal('bell\x07 and null\x00 and del\x7f'), Literal('Umngqusho – “samp” ✓'),
+                Literal('Melktert', lang='af'), Literal('42', datatype=XSD.integer)]
+    lines = [ntriples_line((FOOD, COMMENT, literal)) for literal in literals]
+    assert all(line.count('\n') == 1 for line in lines)
+    assert set(parse(lines)) == {(FOOD, COMMENT, literal) for literal in literals}
+
+def test_iris_escape_characters_n_triples_does_not_allow():
+    assert ntriples_term(URIRef("http://example.org/food#Bunny chow")) == "<http://example.org/food#Bunny\\u0020chow>"
+    assert ntriples_term(URIRef('http://example.org/a<b>"c"')) == "<http://example.org/a\\u003Cb\\u003E\\u0022c\\u0022>"
+    node = BNode('b1')
+    assert ntriples_line((node, COMMENT, Literal('x'))).startswith('_:b1 ')
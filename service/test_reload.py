@@ -0,0 +1,52 @@
+"""
+Tests of reloads: indexes updated for the changed foods only must match
+indexes built from scratch for the new mappings.
+"""
+import json
+import random
+
+from app import ClassHierarchy, FacetIndex
+
+def changed_mappings(food_mappings, seed):
+    """Mappings with some foods removed, changed and added"""
+    rng = random.Random(seed)
+    names = sorted(food_mappings)
+    removed = set(rng.sample(names, 12))
+    updated = {name: dict(properties) for name, properties in food_mappings.items() if name not in removed}
+    for name in rng.sample(sorted(updated), 12):
+        updated[name]['region'] = "Karoo"
+        updated[name]['ontology_class'] = "Stew"
+    for i in range(10):
+        updated[f"{rng.choice(names)} {i}"] = {"category": "Stew", "region": "Karoo", "ontology_class": "Bredie"}
+    return updated
+
+def test_facet_index_update_matches_a_fresh_build(catalogue):
+    hierarchy = ClassHierarchy({"Food": set(), "Stew": {"Food"}, "Bredie": {"Stew"}, "CookedFood": {"Food"}})
+    facets = FacetIndex(catalogue, hierarchy)
+    updated = changed_mappings(catalogue, seed=5)
+    
+    changed = [name for name in updated if name in catalogue and updated[name] != catalogue[name]]
+    added = [name for name in updated if name not in catalogue]
+    removed = [name for name in catalogue if name not in updated]
+    incremental = facets.updated(catalogue, updated, changed, added, removed)
+    fresh = FacetIndex(updated, hierarchy)
+    
+    assert incremental.names == fresh.names
+    assert incremental.all_bits == fresh.all_bits
+    assert incremental.bitsets == fresh.bitsets
+    # The index it was updated from is left as it was
+    assert facets.bitsets == FacetIndex(catalogue, hierarchy).bitsets
+
+def test_reload_keeps_the_catalogue_hash_of_a_full_computation(service_module):
+    service = service_module.FoodSemanticService()
+    service._elasticsearch_catalogue_hash()
+    
+    updated = changed_mappings(service.food_mappings, seed=9)
+    with open(service_module.MAPPINGS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"food_mappings": updated}, f)
+    service.reload()
+    
+    fresh = service_module.FoodSemanticService()
+    assert fresh.food_mappings == service.food_mappings
+    assert service._elasticsearch_catalogue_hash() == fresh._elasticsearch_catalogue_hash()
+    assert service.facets.bitsets == fresh.facets.bitsets
@@ -0,0 +1,141 @@
+"""
+Tests of the smart search index: snapshots and incremental updates must
+give the same answers as an index freshly built from the same mappings.
+"""
+import difflib
+import heapq
+import random
+import threading
+
+from app import SmartSearchEngine
+from benchmark import query_mix
+
+QUERIES = ["bread", "PILAU", "bred", "plaw", "spiced rice", "beans", "curry lamb", "koek", "a", "zz"]
+
+def results(engine, query):
+    """Every result of a query, independent of the order of ties"""
+    return sorted((result['food_name'], round(result['total_score'], 9), result['match_type'])
+                  for result in engine.smart_search(query, 10000))
+
+def suggestions(engine, query):
+    return sorted(item['suggestion'] for item in engine.suggest_corrections(query, 50))
+
+def assert_same_answers(engine, reference, food_mappings):
+    queries = QUERIES + [query for _, query in query_mix(food_mappings, 60, seed=3)]
+    for query in queries:
+        assert results(engine, query) == results(reference, query), query
+        assert suggestions(engine, query) == suggestions(reference, query), query
+
+def ranking(engine, query, max_results):
+    return [(result['food_name'], result['total_score'], result['match_type'], result['query_matched'])
+            for result in engine.smart_search(query, max_results)]
+
+def full_comparison_ranking(engine, query, max_results):
+    """Ranking of smart_search() when difflib compares the query with every term"""
+    query = query.lower().strip()
+    best = {}
+    engine._find_exact_matches(query, best)
+    engine._find_partial_matches(query, best)
+    for term in engine.terms:
+        similarity = difflib.SequenceMatcher(None, query, term).ratio()
+        if similarity > 0.6:
+            for posting in engine.search_index[term]:
+                food_id, match_type = posting >> engine.TYPE_BITS, posting & engine.TYPE_MASK
+                score = engine.MATCH_SCORES[match_type] * similarity
+                if food_id not in best or score > best[food_id][0]:
+                    best[food_id] = (score, 'fuzzy_', match_type, term, similarity)
+    ranked = heapq.nlargest(max_results, best.items(), key=lambda item: item[1][0])
+    return [(engine.food_names[food_id], score, kind + engine.MATCH_TYPES[match_type], query_matched)
+            for food_id, (score, kind, match_type, query_matched, _) in ranked]
+
+def test_fuzzy_ranking_matches_a_full_comparison(catalogue):
+    engine = SmartSearchEngine(catalogue)
+    queries = QUERIES + ["pap", "bobotie", "sweet bobotie with rice", "curry lamb 1234"]
+    queries += [query for _, query in query_mix(catalogue, 80, seed=11)]
+    for query in queries:
+        expected = full_comparison_ranking(engine, query, 10000)
+        for max_results in (1, 5, 20, 10000):
+            assert ranking(engine, query, max_results) == expected[:max_results], query
+    
+    # Scattered single characters: no bigram of 'qabcd' is in 'axbyczdr'
+    engine = SmartSearchEngine({"Axbyczdr": {}, "Qabxx": {}})
+    assert ranking(engine, "qabcd", 20) == [("Axbyczdr", 2 * 4 / 13, "fuzzy_name", "axbyczdr")]
+
+def test_snapshot_round_trip(tmp_path, catalogue):
+    engine = SmartSearchEngine(catalogue)
+    path = str(tmp_path / 'foods.search-index')
+    engine.write_snapshot(path, 'content-hash')
+    
+    loaded = SmartSearchEngine.load_snapshot(path, catalogue, 'content-hash')
+    assert loaded is not None
+    assert loaded.food_names == engine.food_names
+    assert set(loaded.search_index) == set(engine.search_index)
+    assert_same_answers(loaded, engine, catalogue)
+
+def test_snapshot_of_other_content_is_not_loaded(tmp_path, catalogue):
+    path = str(tmp_path / 'foods.search-index')
+    SmartSearchEngine(catalogue).write_snapshot(path, 'content-hash')
+    assert SmartSearchEngine.load_snapshot(path, catalogue, 'other-hash') is None
+    assert SmartSearchEngine.load_snapshot(str(tmp_path / 'missing'), catalogue, 'content-hash') is None
+
+def test_incremental_updates_match_a_fresh_build(tmp_path, catalogue):
+    rng = random.Random(7)
+    names = sorted(catalogue)
+    removed = rng.sample(names, 15)
+    changed = rng.sample([name for name in names if name not in removed], 15)
+    
+    updated = {name: dict(properties) for name, properties in catalogue.items() if name not in removed}
+    for name in changed:
+        updated[name]['primary_ingredients'] = updated[name]['primary_ingredients'][1:] + ["Saffron"]
+        updated[name]['region'] = "Karoo"
+    added = {f"New dish {i}": {"category": "Stew", "primary_ingredients": ["Lamb", "Quince"],
+                               "cultural_origin": "Karoo"} for i in range(10)}
+    updated.update(added)
+    
+    # Applied the way FoodSemanticService.reload() does, to an engine loaded from a snapshot
+    path = str(tmp_path / 'foods.search-index')
+    SmartSearchEngine(catalogue).write_snapshot(path, 'content-hash')
+    engine = SmartSearchEngine.load_snapshot(path, catalogue, 'content-hash')
+    for name in changed + removed:
+        engine.remove_food(name, catalogue[name])
+    for name in changed + list(added):
+        engine.add_food(name, updated[name])
+    engine.food_mappings = updated
+    
+    assert_same_answers(engine, SmartSearchEngine(updated), updated)
+    for name in removed:
+        assert name not in {result[0] for result in results(engine, name)}
+
+def test_searches_during_updates(catalogue):
+    engine = SmartSearchEngine(catalogue)
+    names = sorted(catalogue)[:20]
+    queries = QUERIES + [name.lower()[:5] for name in names]
+    errors = []
+    done = threading.Event()
+    
+    def search():
+        while not done.is_set():
+            for query in queries:
+                try:
+                    engine.smart_search(query)
+                    engine.suggest_corrections(query)
+                except Exception as e:
+                    errors.append(e)
+    
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(5):
+            with engine.updating():
+                for name in names:
+                    engine.remove_food(name, catalogue[name])
+            for name in names:
+                engine.add_food(name, catalogue[name])
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+    
+    assert not errors
+    assert_same_answers(engine, SmartSearchEngine(catalogue), catalogue)
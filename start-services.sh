@@ -11,16 +11,23 @@ cd /opt/fuseki
 echo "⏳ Waiting for Fuseki to initialize..."
 sleep 15
 
-# Load ontology into Fuseki
+# Load ontology into Fuseki, in its own named graph (queries see the union of the named graphs)
 echo "📥 Loading ontology data..."
 curl -X POST \
   --data-binary @/app/data/ontology/WebSemantics.rdf \
   --header "Content-Type: application/rdf+xml" \
-  "http://localhost:3030/food-kb/data"
+  "http://localhost:3030/food-kb/data?graph=http://www.semanticweb.org/zaz/ontologies/2025/4/untitled-ontology-8/graphs/ontology"
 
 echo ""
 echo "✅ Ontology loaded successfully!"
 
+# Load the foods, with their RDFS/OWL RL entailments materialized into the inferred graph
+echo "🧠 Loading foods and materializing inferences..."
+if ! (cd /app/service && python3 populate_kb.py --mappings /app/data/food_mappings.json --ontology /app/data/ontology/WebSemantics.rdf); then
+    echo "❌ Failed to load the knowledge base"
+    exit 1
+fi
+
 # Wait for Elasticsearch to be ready
 echo "🔍 Waiting for Elasticsearch to be ready..."
 while ! curl -s http://elasticsearch:9200/_cluster/health > /dev/null; do
@@ -30,7 +37,7 @@ done
 
 echo "✅ Elasticsearch is ready!"
 
-# Start the Python web service
-echo "🌐 Starting Flask web service..."
+# Start the Python web service (workers and threads: GUNICORN_WORKERS, GUNICORN_THREADS)
+echo "🌐 Starting Flask web service with gunicorn..."
 cd /app/service
-python3 app.py
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py
\ No newline at end of file